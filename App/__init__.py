@@ -3,13 +3,28 @@
 
 import os, pathlib, dotenv, subprocess
 from flask import Flask, redirect
-from flask_sqlalchemy import SQLAlchemy
+from App.tenants import TenantSQLAlchemy
 
-db = SQLAlchemy()
+db = TenantSQLAlchemy()
 
-def create_app() -> Flask:
+def create_app(config: dict | None = None) -> Flask:
+    # The blueprints and extensions are imported here, not deferred: Flask
+    # needs them registered before the first request, and they cost little
+    # next to Flask and SQLAlchemy. Cold start is cut by the template
+    # bytecode cache (App.warmup) instead.
     from App.routes import view, edit
+    from App.api import api, documents
     from App.models import create_db
+    from App.cache import page_cache
+    from App.migrations import upgrade
+    from App.active import active_production
+    from App.metrics import instrumentation
+    from App.jobs import jobs
+    from App.tenants import tenants, add_tenant_command
+    from App.live import broadcaster
+    from App.snapshots import snapshots
+    from App.warmup import bytecode_cache, precompile_command
+    from App.database import database_uri, engine_options, install_sqlite_pragmas, sqlite_pragmas
 
     this_app = Flask(__name__)
     this_dir = pathlib.Path(__file__).parent
@@ -18,28 +33,64 @@ def create_app() -> Flask:
     if os.environ.get("RENDER") is None:
         dotenv.load_dotenv(this_dir / ".flaskenv")
     this_app.config.from_prefixed_env()
+    if config:
+        this_app.config.update(config)
 
-    data_file = this_app.config.get("DATA_FILE", "cast") + ".sqlite3"
-    if os.environ.get("RENDER"):
-        db_path = pathlib.Path("/opt/render/project/src/tmp") / data_file
-    else:
-        db_path = this_dir.parent / "data" / data_file
+    # A Postgres DATABASE_URL replaces the bundled SQLite file
+    database_url = this_app.config.get("DATABASE_URL") or os.environ.get("DATABASE_URL")
+    if database_url and "SQLALCHEMY_DATABASE_URI" not in this_app.config:
+        this_app.config["SQLALCHEMY_DATABASE_URI"] = database_uri(database_url)
 
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db_path = None
+    if "SQLALCHEMY_DATABASE_URI" not in this_app.config:
+        data_file = this_app.config.get("DATA_FILE", "cast") + ".sqlite3"
+        if os.environ.get("RENDER"):
+            db_path = pathlib.Path("/opt/render/project/src/tmp") / data_file
+        else:
+            db_path = this_dir.parent / "data" / data_file
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        this_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
 
-    this_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
     this_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    this_app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        engine_options(this_app.config["SQLALCHEMY_DATABASE_URI"], this_app.config),
+    )
+
+    this_app.jinja_env.bytecode_cache = bytecode_cache(this_app)
+    this_app.cli.add_command(precompile_command)
+    this_app.cli.add_command(add_tenant_command)
 
     with this_app.app_context():
         
         db.init_app(this_app)
+        tenants.init_app(this_app)
+        snapshots.init_app(this_app)
+        install_sqlite_pragmas(db.engine, sqlite_pragmas(this_app.config))
+        page_cache.init_app(this_app)
+        documents.init_app(this_app)
+        active_production.init_app(this_app)
+        instrumentation.init_app(this_app, db.engine)
+        jobs.init_app(this_app)
+        broadcaster.init_app(this_app)
+        tenants.on_open(instrumentation.watch)
+        tenants.on_open(lambda engine: jobs.recover())
+        tenants.on_open(snapshots.refresh)
+        snapshots.on_open(instrumentation.watch)
 
-        if not db_path.exists():
+        if db_path is not None and not db_path.exists():
             print("DB not found — creating...")
-            create_db(this_app)
+            create_db(this_app, seed=True)
+
+        db.create_all()
+        upgrade(db.engine)
+        snapshots.refresh(db.engine)
+        jobs.recover()
 
     this_app.register_blueprint(view, url_prefix="/view")
     this_app.register_blueprint(edit, url_prefix="/edit")
+    this_app.register_blueprint(api, url_prefix="/api")
 
     @this_app.route("/")
     def root_redirect():
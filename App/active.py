@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Musical active production """
+
+import time
+from sqlalchemy import select, update
+
+from App import db
+from App.models import Settings
+from App.tenants import current_tenant
+from App.snapshots import reading_published
+
+
+class ActiveProduction:
+    """In-process cache of the single settings row naming the active production.
+
+    Lookups are answered from memory. Every ttl seconds one primary-key read
+    compares the row's version and production id, so a switch made by
+    another gunicorn worker, or a deletion, shows up within ttl. Each tenant has its own settings row, and the
+    published snapshot its own copy of it.
+    """
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        # (tenant, published) -> [production_id, version, checked]
+        self._state = {}
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get("ACTIVE_PRODUCTION_TTL", self.ttl))
+        app.extensions["active_production"] = self
+
+    def get_id(self):
+        state = self._state.get((current_tenant(), reading_published()))
+        if state is None or time.monotonic() - state[2] >= self.ttl:
+            state = self.refresh()
+        return state[0]
+
+    def refresh(self):
+        key = (current_tenant(), reading_published())
+        row = db.session.execute(
+            select(Settings.active_production_id, Settings.version).where(Settings.id == Settings.ROW_ID)
+        ).first()
+        state = self._state.get(key, [None, None, 0.0])
+        if row is None:
+            state = [None, None, 0.0]
+        elif row.version != state[1] or row.active_production_id != state[0]:
+            # Deleting the production clears the id through ON DELETE SET NULL, without a new version
+            state = [row.active_production_id, row.version, 0.0]
+        state[2] = time.monotonic()
+        self._state[key] = state
+        return state
+
+    def set(self, production_id):
+        """Switch the active production with one UPDATE; the caller commits"""
+        db.session.execute(
+            update(Settings)
+            .where(Settings.id == Settings.ROW_ID)
+            .values(active_production_id=production_id, version=Settings.version + 1)
+        )
+        # Re-read on the next lookup, after the caller's commit
+        self._state.pop((current_tenant(), False), None)
+
+
+active_production = ActiveProduction()
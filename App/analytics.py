@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+""" Musical participation analytics """
+
+from sqlalchemy import Integer, case, delete, extract, func, insert, literal, or_, select, true
+
+from App.models import (
+    Production, Students, Role, RoleAssignment, CrewAssignment, SongAssignment, Participation, RoleStats,
+)
+
+# The summaries hold one row per (production, student) and per role, so
+# the reports below aggregate a few thousand rows instead of walking
+# every assignment. The edit handlers rebuild the production they saved.
+
+PARTICIPATION_COLUMNS = ["production_id", "student_id", "year", "roles", "crew"]
+
+
+# --- Refresh ---
+
+def refresh(session, production_id):
+    """Rebuild one production's summary rows (5 statements); the caller commits.
+
+    session may be a Session or a Connection.
+    """
+    pid = literal(production_id, Integer)
+    crew = select(CrewAssignment.student_id).where(CrewAssignment.production_id == production_id)
+
+    session.execute(delete(Participation).where(Participation.production_id == production_id))
+    session.execute(insert(Participation).from_select(
+        PARTICIPATION_COLUMNS,
+        select(pid, Students.id, Students.year, func.count(), Students.id.in_(crew))
+        .join(RoleAssignment, RoleAssignment.student_id == Students.id)
+        .join(Role, Role.id == RoleAssignment.role_id)
+        .where(Role.production_id == production_id)
+        .group_by(Students.id, Students.year),
+    ))
+    # Crew who are not also in the cast
+    session.execute(insert(Participation).from_select(
+        PARTICIPATION_COLUMNS,
+        select(pid, Students.id, Students.year, literal(0, Integer), true())
+        .where(Students.id.in_(crew))
+        .where(Students.id.not_in(
+            select(Participation.student_id).where(Participation.production_id == production_id)
+        )),
+    ))
+
+    session.execute(delete(RoleStats).where(RoleStats.production_id == production_id))
+    session.execute(insert(RoleStats).from_select(
+        ["role_id", "production_id", "songs"],
+        select(Role.id, Role.production_id, func.count(SongAssignment.song_id))
+        .outerjoin(SongAssignment, SongAssignment.role_id == Role.id)
+        .where(Role.production_id == production_id)
+        .group_by(Role.id, Role.production_id),
+    ))
+
+def build_summaries(connection):
+    """Summarize productions that have assignments but no summary rows yet"""
+    summarized = select(RoleStats.production_id).union(select(Participation.production_id))
+    missing = connection.scalars(
+        select(Production.id)
+        .where(Production.id.not_in(summarized))
+        .where(or_(
+            Production.id.in_(select(Role.production_id).where(Role.production_id.is_not(None))),
+            Production.id.in_(select(CrewAssignment.production_id)),
+        ))
+    ).all()
+    for production_id in missing:
+        refresh(connection, production_id)
+    return [f"analytics for production {production_id}" for production_id in missing]
+
+
+# --- Reports ---
+
+def season():
+    return extract("year", Production.start_date)
+
+def student_shows(session, limit=None):
+    """Students by how many productions they were in: (name, year, shows, roles, crew)"""
+    shows = func.count()
+    return session.execute(
+        select(
+            Students.name,
+            Students.year,
+            shows.label("shows"),
+            func.sum(Participation.roles).label("roles"),
+            func.sum(case((Participation.crew, 1), else_=0)).label("crew"),
+        )
+        .join(Participation, Participation.student_id == Students.id)
+        .group_by(Students.id, Students.name, Students.year)
+        .order_by(shows.desc(), Students.name)
+        .limit(limit)
+    ).all()
+
+def roles_by_year(session):
+    """Students and roles per class year in each production, by season"""
+    return session.execute(
+        select(
+            season().label("season"),
+            Production.title,
+            Participation.year,
+            func.count().label("students"),
+            func.sum(Participation.roles).label("roles"),
+        )
+        .join(Participation, Participation.production_id == Production.id)
+        .group_by(Production.id, Production.title, Production.start_date, Participation.year)
+        .order_by(Production.start_date, Production.id, Participation.year)
+    ).all()
+
+def songs_per_role(session):
+    """Roles, songs sung, and the average and most songs per role in each production, by season"""
+    return session.execute(
+        select(
+            season().label("season"),
+            Production.title,
+            func.count().label("roles"),
+            func.sum(RoleStats.songs).label("songs"),
+            func.avg(RoleStats.songs).label("average"),
+            func.max(RoleStats.songs).label("most"),
+        )
+        .join(RoleStats, RoleStats.production_id == Production.id)
+        .group_by(Production.id, Production.title, Production.start_date)
+        .order_by(Production.start_date, Production.id)
+    ).all()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+""" Musical JSON API """
+
+import gzip, hashlib, json, threading
+from collections import OrderedDict
+from flask import Blueprint, Response, abort, g, request
+
+from App import db, queries
+from App.cache import ProductionVersions
+from App.tenants import current_tenant
+from App.snapshots import snapshots
+from App.models import Production
+
+api = Blueprint("api", __name__, url_prefix="/api")
+
+SECTIONS = ("production", "cast", "songs", "team")
+PAGED_SECTIONS = ("cast", "songs")
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 1000
+# Smaller bodies are not worth compressing
+GZIP_MIN_BYTES = 512
+
+
+# --- Documents ---
+
+def build_section(production_id, section):
+    """Serialize one section of a production's program with the page loaders"""
+    # marshmallow is slow to import; load it with the first document, not at startup
+    from App.schemas import ProductionSchema, StudentSchema, RoleSchema, SongSchema, CreativeAssignmentSchema
+
+    if section == "production":
+        return ProductionSchema().dump(queries.production_page(production_id))
+    if section == "cast":
+        return RoleSchema(many=True).dump(queries.cast_page(production_id))
+    if section == "songs":
+        return SongSchema(many=True).dump([song for _, songs in queries.songs_page(production_id) for song in songs])
+    if section == "team":
+        crew, team = queries.team_page(production_id)
+        return {
+            "crew": StudentSchema(many=True).dump(crew),
+            "creative": CreativeAssignmentSchema(many=True).dump(team),
+        }
+    raise KeyError(section)
+
+
+class ProgramDocuments:
+    """One denormalized program document per production, rebuilt per section.
+
+    Saves mark only the sections they touch as stale; the next read rebuilds
+    those sections and reuses the rest. At most max_size documents are kept,
+    least recently used first out, and a change to a production in another
+    worker, or in a new snapshot, drops its document through its version.
+    A section rebuilt while it was invalidated is not kept.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.versions = ProductionVersions()
+        # Moves on every invalidation, so a build that began before one is not stored
+        self.generation = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_size = int(app.config.get("API_DOCUMENT_CACHE_SIZE", self.max_size))
+        self.versions.ttl = float(app.config.get("PAGE_CACHE_TTL", self.versions.ttl))
+        app.extensions["documents"] = self
+
+    def section(self, production_id, section):
+        if self.max_size and self.versions.changed(production_id):
+            self.invalidate(production_id)
+        key = (current_tenant(), production_id)
+        with self._lock:
+            cached = self._documents.get(key, {}).get(section)
+            if cached is not None:
+                self._documents.move_to_end(key)
+            generation = self.generation
+        if cached is None:
+            cached = build_section(production_id, section)
+            with self._lock:
+                if generation != self.generation:
+                    return cached
+                self._documents.setdefault(key, {})[section] = cached
+                self._documents.move_to_end(key)
+                while len(self._documents) > self.max_size:
+                    self._documents.popitem(last=False)
+        return cached
+
+    def document(self, production_id):
+        return {section: self.section(production_id, section) for section in SECTIONS}
+
+    def invalidate(self, production_id=None, sections=None):
+        """Drop sections of one production, or of all the tenant's if none given"""
+        tenant = current_tenant()
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._documents if key[0] == tenant and production_id in (None, key[1])]
+            for key in keys:
+                document = self._documents[key]
+                for section in sections or list(document):
+                    document.pop(section, None)
+
+    def saved(self, production_id=None, sections=None):
+        """After a save's commit: drop the sections if readers see the draft"""
+        if not snapshots.publishes(db.engine):
+            self.invalidate(production_id, sections)
+
+    def __len__(self):
+        return len(self._documents)
+
+
+documents = ProgramDocuments()
+
+
+# --- Responses ---
+
+def select_fields(item, fields):
+    if not fields or not isinstance(item, dict):
+        return item
+    return {key: value for key, value in item.items() if key in fields}
+
+def json_response(data):
+    """Compact JSON with an ETag, 304 support and gzip when the client accepts it"""
+    body = json.dumps(data, separators=(",", ":"), default=str).encode("utf8")
+    compress = len(body) >= GZIP_MIN_BYTES and "gzip" in request.accept_encodings
+    # The gzip and identity bodies differ byte for byte, so each has its own strong ETag
+    etag = hashlib.sha1(body).hexdigest() + ("-gzip" if compress else "")
+
+    response = Response(mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+        response.content_encoding = "gzip"
+    response.set_data(body)
+    return response
+
+def requested_fields():
+    fields = request.args.get("fields")
+    return set(fields.split(",")) if fields else None
+
+
+# --- Routes ---
+
+@api.before_request
+def read_published():
+    # Readers get the published program, like the view pages
+    g.published = True
+    # Notices a newly published snapshot and drops the stale documents
+    db.engine
+
+def production_or_404(production_id):
+    if Production.query.get(production_id) is None:
+        abort(404)
+
+@api.get("/productions/<int:production_id>")
+def program(production_id):
+    production_or_404(production_id)
+    return json_response(select_fields(documents.document(production_id), requested_fields()))
+
+@api.get("/productions/<int:production_id>/<section>")
+def program_section(production_id, section):
+    if section not in SECTIONS:
+        abort(404)
+    production_or_404(production_id)
+    data = documents.section(production_id, section)
+    fields = requested_fields()
+
+    if section not in PAGED_SECTIONS:
+        return json_response(select_fields(data, fields))
+
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", DEFAULT_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    items = data[(page - 1) * per_page:page * per_page]
+    return json_response({
+        "items": [select_fields(item, fields) for item in items],
+        "page": page,
+        "per_page": per_page,
+        "total": len(data),
+    })
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+""" Musical assignment sync """
+
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import delete, insert, select, tuple_
+
+from App import db
+
+SyncStats = namedtuple("SyncStats", ["table", "scope", "inserted", "deleted", "seconds"])
+
+
+def sync_assignments(table, scope_column, other_column, scope_ids, desired):
+    """Make the association rows for scope_ids equal to desired.
+
+    Reads the current (scope, other) pairs once and writes only the
+    difference, as one bulk DELETE and one bulk INSERT. Pairs outside
+    scope_ids are ignored. Returns SyncStats and logs them.
+    """
+    started = time.perf_counter()
+    scope_col = table.c[scope_column]
+    other_col = table.c[other_column]
+    scope_ids = set(scope_ids)
+    if not scope_ids:
+        return SyncStats(table.name, 0, 0, 0, 0.0)
+
+    current = {
+        tuple(row)
+        for row in db.session.execute(
+            select(scope_col, other_col).where(scope_col.in_(scope_ids))
+        )
+    }
+    desired = {pair for pair in desired if pair[0] in scope_ids}
+
+    to_delete = current - desired
+    to_insert = desired - current
+
+    if to_delete:
+        db.session.execute(
+            delete(table).where(tuple_(scope_col, other_col).in_(sorted(to_delete)))
+        )
+    if to_insert:
+        db.session.execute(
+            insert(table),
+            [{scope_column: a, other_column: b} for a, b in sorted(to_insert)],
+        )
+
+    stats = SyncStats(table.name, len(scope_ids), len(to_insert), len(to_delete), time.perf_counter() - started)
+    current_app.logger.info(
+        "sync %s: %d in scope, %d inserted, %d deleted in %.1f ms",
+        stats.table, stats.scope, stats.inserted, stats.deleted, stats.seconds * 1000,
+    )
+    return stats
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+""" Musical page cache """
+
+import hashlib, threading, time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from flask import Response, make_response, request, stream_with_context
+from sqlalchemy import func, select, update
+
+from App import db
+from App.models import Production
+from App.tenants import current_tenant
+from App.snapshots import reading_published, snapshots
+
+CachedPage = namedtuple("CachedPage", ["body", "etag", "last_modified"])
+
+
+class ProductionVersions:
+    """Each production's content_version, as seen by one in-process cache.
+
+    Saves bump their production's version in the database. Every ttl
+    seconds one primary-key read per production tells whether another
+    gunicorn worker saved it since the last look, the same way the active
+    production is kept in step. Read through the published snapshot, the
+    versions only move when it is republished.
+    """
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        # (tenant, published, production_id) -> [version, checked]
+        self._state = {}
+
+    def changed(self, production_id):
+        """Whether the production's version moved since the last check; at most one read per ttl"""
+        key = (current_tenant(), reading_published(), production_id)
+        state = self._state.get(key)
+        now = time.monotonic()
+        if state is not None and now - state[1] < self.ttl:
+            return False
+        version = db.session.scalar(select(Production.content_version).where(Production.id == production_id))
+        self._state[key] = [version, now]
+        return state is not None and state[0] != version
+
+    def expire(self):
+        """Check the tenant's versions again on their next lookup, as after a new snapshot"""
+        tenant, published = current_tenant(), reading_published()
+        for key, state in list(self._state.items()):
+            if key[:2] == (tenant, published):
+                state[1] = float("-inf")
+
+    @staticmethod
+    def bump(production_id=None):
+        """Tell every worker the production (all of them if None) changed; the caller commits"""
+        statement = update(Production).values(content_version=func.coalesce(Production.content_version, 0) + 1)
+        if production_id is not None:
+            statement = statement.where(Production.id == production_id)
+        db.session.execute(statement)
+
+
+class PageCache:
+    """LRU cache of rendered view pages keyed by (production_id, page).
+
+    Entries are kept per tenant, whose production ids overlap. Each worker
+    has its own; a change to a production, saved by another worker or
+    published in a new snapshot, is noticed through its version and drops
+    only that production's pages. A page rendered while it was invalidated
+    is not kept.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.versions = ProductionVersions()
+        # Moves on every invalidation, so a render that began before one is not stored
+        self.generation = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_size = int(app.config.get("PAGE_CACHE_SIZE", self.max_size))
+        self.versions.ttl = float(app.config.get("PAGE_CACHE_TTL", self.versions.ttl))
+        app.extensions["page_cache"] = self
+
+    def get(self, key):
+        if self.max_size and self.versions.changed(key[0]):
+            self.invalidate(key[0])
+        key = (current_tenant(), *key)
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None:
+                self._pages.move_to_end(key)
+            return entry
+
+    def put(self, key, body, generation=None):
+        """Store a page, unless the cache was invalidated since generation was read"""
+        entry = CachedPage(
+            body=body,
+            etag=hashlib.sha1(body.encode("utf8")).hexdigest(),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+        )
+        key = (current_tenant(), *key)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._pages[key] = entry
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+        return entry
+
+    def invalidate(self, production_id=None, page=None):
+        """Drop the tenant's entries matching the production and/or page (all if neither)"""
+        tenant = current_tenant()
+        with self._lock:
+            self.generation += 1
+            for key in list(self._pages):
+                if key[0] != tenant:
+                    continue
+                if production_id is not None and key[1] != production_id:
+                    continue
+                if page is not None and key[2] != page:
+                    continue
+                del self._pages[key]
+
+    def changed(self, production_id=None):
+        """In a save's transaction: the production's pages go stale once it commits.
+
+        The saving worker calls saved() after its commit.
+        """
+        self.versions.bump(production_id)
+
+    def saved(self, production_id=None):
+        """After a save's commit: drop the production's pages if readers see the draft.
+
+        Pages read from a published snapshot stay valid until it is republished.
+        """
+        if not snapshots.publishes(db.engine):
+            self.invalidate(production_id)
+
+    def __len__(self):
+        return len(self._pages)
+
+
+page_cache = PageCache()
+
+
+def cached_page(production_id, page, render):
+    """Serve a rendered page from the cache, answering 304 when it is unchanged"""
+    if not reading_published():
+        return draft_response(render())
+    key = (production_id, page)
+    entry = page_cache.get(key)
+    if entry is None:
+        generation = page_cache.generation
+        entry = page_cache.put(key, render(), generation)
+    return cached_response(entry)
+
+def streamed_page(production_id, page, stream, chunk_size=8192):
+    """Like cached_page, but a miss sends the page while stream() renders it.
+
+    The template's many small pieces go out in chunk_size writes; the
+    whole body is cached once the last one is sent, unless a save
+    invalidated the cache while it streamed.
+    """
+    if not reading_published():
+        return draft_response(stream())
+    key = (production_id, page)
+    entry = page_cache.get(key)
+    if entry is not None:
+        return cached_response(entry)
+
+    generation = page_cache.generation
+    pieces = stream()
+
+    @stream_with_context
+    def send():
+        body, pending, size = [], [], 0
+        for piece in pieces:
+            pending.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                chunk = "".join(pending)
+                body.append(chunk)
+                yield chunk
+                pending, size = [], 0
+        chunk = "".join(pending)
+        body.append(chunk)
+        yield chunk
+        # Not reached if the client hangs up part way
+        page_cache.put(key, "".join(body), generation)
+
+    response = Response(send(), mimetype="text/html")
+    response.cache_control.no_cache = True
+    return response
+
+def draft_response(body):
+    """An unpublished preview: never cached, here or by the browser"""
+    response = Response(body, mimetype="text/html")
+    response.cache_control.no_store = True
+    return response
+
+def cached_response(entry):
+    response = make_response(entry.body)
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
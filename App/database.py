@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+""" Musical database engine settings """
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Applied to every new SQLite connection; override any of them with the
+# SQLITE_PRAGMAS config (FLASK_SQLITE_PRAGMAS='{"cache_size": -20000}')
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -65536,  # KiB, i.e. 64 MiB per connection
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    # Off by default in SQLite; the ON DELETE CASCADE keys depend on it
+    "foreign_keys": "ON",
+}
+
+# Published snapshots are opened immutable: nothing to lock or journal,
+# so map the whole file and refuse writes
+SNAPSHOT_PRAGMAS = {
+    "query_only": "ON",
+    "cache_size": -16384,
+    "mmap_size": 1073741824,
+    "temp_store": "MEMORY",
+}
+
+
+def database_uri(url):
+    """Normalise a Postgres URL (e.g. Render's DATABASE_URL) to the psycopg driver"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def sqlite_pragmas(config):
+    return {**SQLITE_PRAGMAS, **config.get("SQLITE_PRAGMAS", {})}
+
+
+def engine_options(uri, config):
+    """Pool settings for SQLALCHEMY_ENGINE_OPTIONS.
+
+    Each gunicorn worker gets its own pool, so keep them small: a sync
+    worker only ever holds one connection at a time.
+    """
+    url = make_url(uri)
+    pool = {
+        "pool_size": int(config.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(config.get("DB_MAX_OVERFLOW", 5)),
+    }
+
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            return {}
+        return {
+            **pool,
+            "connect_args": {
+                "timeout": sqlite_pragmas(config)["busy_timeout"] / 1000,
+                "check_same_thread": False,
+            },
+        }
+
+    return {
+        **pool,
+        "pool_pre_ping": True,
+        "pool_recycle": int(config.get("DB_POOL_RECYCLE", 1800)),
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas=None):
+    """Run the PRAGMA profile on each connection the engine opens"""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+""" Musical static export """
+
+import gzip, hashlib, pathlib
+from flask import g
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def page_path(out_dir, production_id, page):
+    """Mirror the /view URL layout so links work from any static host"""
+    if page == "general":
+        return out_dir / "view" / str(production_id) / "index.html"
+    return out_dir / "view" / str(production_id) / page / "index.html"
+
+
+def write_page(path, html):
+    """Write a page and its precompressed variants; False if unchanged"""
+    data = html.encode("utf8")
+    if path.exists() and hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest():
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data))
+    return True
+
+
+def copy_file(path, source):
+    """Copy an already-compressed file such as an image; False if unchanged"""
+    data = source.read_bytes()
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return True
+
+
+def export_production(app, production_id, out_dir):
+    """Render every published program page for a production; returns the paths rewritten"""
+    from App import images, queries
+    from App.routes import PAGES
+    from App.snapshots import published
+
+    out_dir = pathlib.Path(out_dir)
+    written = []
+    with published(app), app.test_request_context():
+        g.exported = True
+        for page, render in PAGES.items():
+            path = page_path(out_dir, production_id, page)
+            if write_page(path, render(production_id)):
+                written.append(path)
+
+        # The bundle's landing page is the exported production
+        index = out_dir / "view" / "index.html"
+        if write_page(index, PAGES["general"](production_id)):
+            written.append(index)
+
+        # Every width and format of the poster, for whichever the srcset picks
+        poster = images.image_sources(queries.production_page(production_id).image)
+        variants = images.poster_variants(poster["src"]) if poster else []
+        for source in variants:
+            target = out_dir / "view" / "images" / source.name
+            if copy_file(target, source):
+                written.append(target)
+
+    # Offline support: the service worker and the files the pages link to
+    static_dir = pathlib.Path(app.static_folder)
+    assets = {out_dir / "view" / "sw.js": static_dir / "sw.js"}
+    for path in static_dir.iterdir():
+        if path.is_file():
+            assets[out_dir / "static" / path.name] = path
+    for target, source in assets.items():
+        if write_page(target, source.read_text(encoding="utf8")):
+            written.append(target)
+    return written
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+""" Musical poster images """
+
+import hashlib, http.client, io, ipaddress, pathlib, re, socket, urllib.parse
+from flask import current_app, url_for
+
+# Widths generated for srcset; the original width is always added
+WIDTHS = (320, 640, 960, 1280)
+FORMATS = ("avif", "webp")
+# The plain <img> src, for browsers that skip the <source> list; first one stored wins
+DEFAULT_FORMATS = ("webp", "avif")
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+VARIANT = re.compile(r"^(?P<digest>[0-9a-f]{16})-(?P<width>\d+)\.(?P<format>avif|webp)$")
+
+
+def image_dir():
+    path = pathlib.Path(current_app.config.get("IMAGE_DIR") or pathlib.Path(current_app.instance_path) / "images")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def pillow():
+    """Pillow's Image and features modules, or (None, None) if it is missing.
+
+    Imported on first use: only ingesting a poster needs it, not startup.
+    """
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return None, None
+    return Image, features
+
+def available_formats():
+    Image, features = pillow()
+    return [fmt for fmt in FORMATS if Image is not None and features.check(fmt)]
+
+
+# --- Ingest ---
+
+def public_address(host, port):
+    """An address host resolves to, refusing hosts with any private, loopback or link-local one"""
+    addresses = sorted({info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)})
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        ip = getattr(ip, "ipv4_mapped", None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"{host} resolves to a non-public address")
+    if not addresses:
+        raise ValueError(f"{host} does not resolve")
+    return addresses[0]
+
+def download(url):
+    """Fetch a poster from a public http(s) URL; no redirects, at most MAX_DOWNLOAD_BYTES.
+
+    The connection goes to the address that was checked, so a second DNS
+    answer cannot point it somewhere private.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("only http(s) URLs can be downloaded")
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    address = public_address(parts.hostname, port)
+
+    connection = (http.client.HTTPSConnection if https else http.client.HTTPConnection)(parts.hostname, port, timeout=10)
+    connection._create_connection = lambda _, *args: socket.create_connection((address, port), *args)
+    try:
+        path = parts.path or "/"
+        connection.request("GET", f"{path}?{parts.query}" if parts.query else path, headers={"User-Agent": "Musical"})
+        response = connection.getresponse()
+        if response.status != 200:
+            raise ValueError(f"download answered {response.status}")
+        if int(response.getheader("Content-Length") or 0) > MAX_DOWNLOAD_BYTES:
+            raise ValueError(f"image larger than {MAX_DOWNLOAD_BYTES} bytes")
+        data = response.read(MAX_DOWNLOAD_BYTES + 1)
+    finally:
+        connection.close()
+    if len(data) > MAX_DOWNLOAD_BYTES:
+        raise ValueError(f"image larger than {MAX_DOWNLOAD_BYTES} bytes")
+    return data
+
+def ingest(data):
+    """Store resized variants of an image; returns the URL of the default one.
+
+    Files are named by the hash of the original bytes, so re-uploading the
+    same poster reuses the existing variants.
+    """
+    Image, _ = pillow()
+    if Image is None:
+        raise RuntimeError("Pillow is required to store images")
+
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    directory = image_dir()
+
+    with Image.open(io.BytesIO(data)) as original:
+        original.load()
+        image = original.convert("RGBA" if original.mode in ("RGBA", "LA", "P") else "RGB")
+
+    formats = available_formats()
+    if not formats:
+        raise RuntimeError(f"Pillow cannot write any of {', '.join(FORMATS)}")
+    default_format = next(fmt for fmt in DEFAULT_FORMATS if fmt in formats)
+
+    widths = sorted({w for w in WIDTHS if w < image.width} | {image.width})
+    for width in widths:
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS
+        )
+        for fmt in formats:
+            path = directory / f"{digest}-{width}.{fmt}"
+            if not path.exists():
+                resized.save(path, fmt.upper(), quality=80)
+
+    default = max(w for w in widths if w <= 960)
+    return url_for("view.image", filename=f"{digest}-{default}.{default_format}")
+
+
+# --- Rendering ---
+
+def poster_variants(image):
+    """Stored files of every width and format of a stored poster's URL"""
+    match = VARIANT.match((image or "").rsplit("/", 1)[-1])
+    if not match:
+        return []
+    return sorted(path for path in image_dir().glob(f"{match['digest']}-*") if VARIANT.match(path.name))
+
+def image_sources(image):
+    """srcset data for a stored poster, or None for a remote URL"""
+    name = (image or "").rsplit("/", 1)[-1]
+    match = VARIANT.match(name)
+    if not match or not (image or "").startswith(url_for("view.image", filename="")):
+        return None
+
+    digest = match["digest"]
+    sources = {}
+    variants = poster_variants(image)
+    for path in variants:
+        variant = VARIANT.match(path.name)
+        sources.setdefault(variant["format"], []).append(int(variant["width"]))
+
+    return {
+        "src": image,
+        # Every variant, for the service worker to keep offline
+        "urls": [url_for("view.image", filename=path.name) for path in variants],
+        "sources": [
+            {
+                "type": f"image/{fmt}",
+                "srcset": ", ".join(
+                    f"{url_for('view.image', filename=f'{digest}-{w}.{fmt}')} {w}w"
+                    for w in sorted(sources[fmt])
+                ),
+            }
+            for fmt in FORMATS if fmt in sources
+        ],
+    }
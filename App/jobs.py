@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+""" Musical background jobs """
+
+import datetime, logging, os, pathlib, socket, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from flask import g
+from sqlalchemy import select, update
+
+from App import db
+from App.models import Production, Job
+from App.active import active_production
+from App.cache import page_cache
+from App.api import documents
+from App.tenants import current_tenant
+
+log = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+class JobQueue:
+    """Thread pool running heavy edits outside the request.
+
+    Each job is a row in the job table, committed before it is handed to a
+    worker, so its status survives the request and is visible to every
+    gunicorn worker. A running job records the host:pid that claimed it, and
+    a heartbeat thread writes its progress to the row every few seconds, so
+    any worker can report it and tell whether its owner is still alive.
+    Jobs run against the tenant that queued them.
+    """
+
+    def __init__(self, workers=2, heartbeat=5, stale_after=600):
+        self.workers = workers
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+        self.app = None
+        self._executor = None
+        self._beating = None
+        self._progress = {}
+        self._recovered = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = int(app.config.get("JOB_WORKERS", self.workers))
+        self.heartbeat = float(app.config.get("JOB_HEARTBEAT", self.heartbeat))
+        self.stale_after = float(app.config.get("JOB_STALE_AFTER", self.stale_after))
+        # A new app replaces the pool; the old one's threads exit once its jobs finish
+        self.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._recovered = set()
+        app.extensions["jobs"] = self
+
+    @staticmethod
+    def owner():
+        # Read at claim time: gunicorn forks workers after the app is imported
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def alive(self, owner, heartbeat_at):
+        """Whether the worker that claimed a job may still be running it"""
+        host, _, pid = (owner or "").rpartition(":")
+        if host == socket.gethostname() and pid.isdigit():
+            # A long write transaction holds up the heartbeat, so trust the process table here
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                pass
+            return True
+        # Another host, or a row from before owners were recorded
+        return heartbeat_at is not None and (datetime.datetime.now() - heartbeat_at).total_seconds() < self.stale_after
+
+    def recover(self):
+        """Fail jobs left running by a dead process and restart queued ones"""
+        tenant = current_tenant()
+        if tenant in self._recovered:
+            return
+        self._recovered.add(tenant)
+        running = db.session.execute(select(Job.id, Job.owner, Job.heartbeat_at).filter_by(status="running")).all()
+        dead = [job.id for job in running if not self.alive(job.owner, job.heartbeat_at)]
+        if dead:
+            log.warning("Failing jobs %s: their workers are gone", dead)
+            db.session.execute(
+                update(Job).where(Job.id.in_(dead), Job.status == "running")
+                .values(status="failed", message="interrupted", finished_at=datetime.datetime.now())
+            )
+        db.session.commit()
+        for job_id in db.session.scalars(db.select(Job.id).filter_by(status="queued")):
+            self._executor.submit(self.run, job_id, tenant)
+
+    def submit(self, kind, production_id=None, **params):
+        """Record a job and queue it; returns the committed Job"""
+        if kind not in HANDLERS:
+            raise KeyError(kind)
+        job = Job(kind=kind, production_id=production_id, params=params, status="queued")
+        db.session.add(job)
+        db.session.commit()
+        self._executor.submit(self.run, job.id, current_tenant())
+        return job
+
+    def status(self, job):
+        """Job row as a dict, with live progress if it is running here; the
+        heartbeat keeps the row's progress current for other workers"""
+        progress, total = job.progress, job.total
+        with self._lock:
+            progress, total = self._progress.get((current_tenant(), job.id), (progress, total))
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "production_id": job.production_id,
+            "status": job.status,
+            "progress": progress,
+            "total": total,
+            "message": job.message,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at,
+        }
+
+    def run(self, job_id, tenant=None):
+        with self.app.app_context():
+            g.tenant = tenant
+            # Claim the job; another worker may have recovered it first
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == "queued")
+                .values(status="running", owner=self.owner(), heartbeat_at=datetime.datetime.now())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return
+
+            job = db.session.get(Job, job_id)
+            key = (tenant, job_id)
+            with self._lock:
+                self._progress[key] = (job.progress or 0, job.total)
+            self._start_heartbeat()
+            def report(done, total=None):
+                with self._lock:
+                    self._progress[key] = (done, total if total is not None else self._progress.get(key, (0, None))[1])
+
+            try:
+                message = HANDLERS[job.kind](job, report)
+                db.session.commit()
+                status = "done"
+            except Exception as e:
+                db.session.rollback()
+                log.error("Job %s (%s) failed\n%s", job_id, job.kind, traceback.format_exc())
+                message, status = str(e), "failed"
+
+            with self._lock:
+                progress, total = self._progress.pop(key, (job.progress, job.total))
+            job = db.session.get(Job, job_id)
+            job.status, job.message = status, message
+            job.progress, job.total = progress, total
+            job.finished_at = datetime.datetime.now()
+            db.session.commit()
+
+            if status == "done":
+                invalidate(job)
+            log.info("Job %s (%s) %s", job_id, job.kind, status)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._beating is None or not self._beating.is_alive():
+                self._beating = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._beating.start()
+
+    def _beat(self):
+        """Write the progress of this process's running jobs to their rows
+        until none are left"""
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                running = dict(self._progress)
+                if not running:
+                    self._beating = None
+                    return
+            for (tenant, job_id), (progress, total) in running.items():
+                with self.app.app_context():
+                    g.tenant = tenant
+                    try:
+                        db.session.execute(
+                            update(Job).where(Job.id == job_id, Job.status == "running")
+                            .values(progress=progress, total=total, heartbeat_at=datetime.datetime.now())
+                        )
+                        db.session.commit()
+                    except Exception:
+                        # The job's own write transaction may hold the lock; try again next beat
+                        db.session.rollback()
+                        log.debug("Heartbeat for job %s skipped", job_id, exc_info=True)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+jobs = JobQueue()
+
+
+def invalidate(job):
+    """Drop cached pages and documents the job may have changed"""
+    if job.kind == "import_roster":
+        # Students appear in every production's cast and crew
+        page_cache.saved()
+        documents.saved()
+    elif job.kind == "delete_production":
+        page_cache.saved(job.production_id)
+        documents.saved(job.production_id)
+
+
+# --- Handlers ---
+
+@handler("delete_production")
+def delete_production(job, report):
+    """Delete a production; the foreign keys cascade to everything it owns"""
+    pid = job.production_id
+    if active_production.get_id() == pid:
+        active_production.set(None)
+    # Its version goes with the row, which the other workers notice
+    Production.query.filter_by(id=pid).delete()
+    report(1, 1)
+    return f"deleted production {pid}"
+
+@handler("import_roster")
+def import_students(job, report):
+    """Import an uploaded roster CSV, then remove the upload"""
+    from App.roster import import_roster
+
+    path = pathlib.Path(job.params["path"])
+    try:
+        with open(path, encoding="utf8") as f:
+            report(0, max(sum(1 for _ in f) - 1, 0))
+        with db.engine.begin() as connection:
+            result = import_roster(connection, path, progress=report)
+    finally:
+        path.unlink(missing_ok=True)
+    page_cache.changed()
+    return f"{result.inserted} inserted, {result.updated} updated, {len(result.rejected)} rejected"
+
+@handler("export")
+def export(job, report):
+    """Write the static site for a production to EXPORT_DIR"""
+    from App.export import export_production
+
+    out_dir = job.params.get("out_dir") or export_dir()
+    written = export_production(jobs.app, job.production_id, out_dir)
+    report(len(written), len(written))
+    return f"{len(written)} files written to {out_dir}"
+
+@handler("rebuild_cache")
+def rebuild_cache(job, report):
+    """Render a production's pages and documents into the caches"""
+    from App.routes import PAGES
+    from App.snapshots import published
+
+    # The view pages and the API show what was last published
+    with published(jobs.app), jobs.app.test_request_context():
+        documents.invalidate(job.production_id)
+        documents.document(job.production_id)
+        for done, (page, render) in enumerate(PAGES.items(), 1):
+            page_cache.put((job.production_id, page), render(job.production_id))
+            report(done, len(PAGES))
+    return f"{len(PAGES)} pages rendered"
+
+
+def export_dir():
+    path = pathlib.Path(jobs.app.config.get("EXPORT_DIR") or pathlib.Path(jobs.app.instance_path) / "export")
+    tenant = current_tenant()
+    return path / tenant if tenant else path
+
+def upload_dir():
+    path = pathlib.Path(jobs.app.config.get("UPLOAD_DIR") or pathlib.Path(jobs.app.instance_path) / "uploads")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+""" Musical live "now performing" broadcast """
+
+import json, threading
+from flask import g
+from sqlalchemy import select
+
+from App import db
+from App.models import Production, Song
+from App.tenants import current_tenant
+
+# Sent to clients on connect: how long to wait before reconnecting (ms)
+RETRY_MS = 5000
+HEARTBEAT = b": heartbeat\n\n"
+
+
+def running_order(production_id):
+    """The production's song ids, titles and acts in program order"""
+    return db.session.execute(
+        select(Song.id, Song.title, Song.act)
+        .filter_by(production_id=production_id)
+        .order_by(Song.act.is_(None), Song.act, Song.id)
+    ).all()
+
+def now_performing(production_id):
+    """The current song as an SSE event; data is null between songs"""
+    current = db.session.scalar(select(Production.current_song_id).filter_by(id=production_id))
+    data = None
+    for number, song in enumerate(running_order(production_id) if current else [], 1):
+        if song.id == current:
+            data = {"song_id": song.id, "title": song.title, "act": song.act, "number": number}
+            break
+    return f"event: song\ndata: {json.dumps(data)}\n\n".encode("utf8")
+
+
+class Channel:
+    """The latest message for one production, and the subscribers waiting on it"""
+
+    def __init__(self, message):
+        self.message = message
+        self.version = 0
+        self.listeners = 0
+        self.condition = threading.Condition()
+
+
+class Broadcaster:
+    """In-process fan-out of the current song to every subscribed program.
+
+    Each publish stores one precomputed message and wakes all subscribers,
+    which share it; an idle subscriber sleeps until a publish or its
+    LIVE_HEARTBEAT. One poller thread per worker re-reads the channels that
+    have listeners every LIVE_POLL seconds (one query per channel, not per
+    subscriber) so a song advanced on another worker still arrives.
+    At most LIVE_MAX_SUBSCRIBERS connections are held per worker. Each one
+    occupies a server thread; gunicorn.conf.py runs gthread workers and
+    caps the subscribers below the thread count.
+    """
+
+    def __init__(self, max_subscribers=500, heartbeat=15.0, poll=2.0):
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.poll = poll
+        self.app = None
+        self.subscribers = 0
+        self._channels = {}
+        self._poller = None
+        # Set when the last subscriber leaves, so the poller stops at once
+        self._idle = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_subscribers = int(app.config.get("LIVE_MAX_SUBSCRIBERS", self.max_subscribers))
+        self.heartbeat = float(app.config.get("LIVE_HEARTBEAT", self.heartbeat))
+        self.poll = float(app.config.get("LIVE_POLL", self.poll))
+        # Channels hold messages read from the previous app's databases
+        self._channels = {}
+        app.extensions["live"] = self
+
+    def channel(self, production_id):
+        key = (current_tenant(), production_id)
+        with self._lock:
+            channel = self._channels.get(key)
+        if channel is None:
+            channel = Channel(now_performing(production_id))
+            with self._lock:
+                channel = self._channels.setdefault(key, channel)
+        return channel
+
+    def publish(self, production_id):
+        """Recompute the production's message and wake its subscribers"""
+        self._publish(self.channel(production_id), now_performing(production_id))
+
+    def _publish(self, channel, message):
+        with channel.condition:
+            if message != channel.message:
+                channel.message = message
+                channel.version += 1
+                channel.condition.notify_all()
+
+    def _poll(self):
+        """Pick up songs advanced by other workers while anyone listens"""
+        while True:
+            self._idle.wait(self.poll)
+            with self._lock:
+                if not self.subscribers:
+                    self._poller = None
+                    return
+                self._idle.clear()
+                listened = [(key, channel) for key, channel in self._channels.items() if channel.listeners]
+            for (tenant, production_id), channel in listened:
+                try:
+                    with self.app.app_context():
+                        g.tenant = tenant
+                        self._publish(channel, now_performing(production_id))
+                except Exception:
+                    self.app.logger.exception("Live poll of production %s failed", production_id)
+
+    def subscribe(self, production_id):
+        """An SSE byte stream for the production, or None at the connection cap"""
+        with self._lock:
+            if self.subscribers >= self.max_subscribers:
+                return None
+            self.subscribers += 1
+            if self._poller is None:
+                self._idle.clear()
+                self._poller = threading.Thread(target=self._poll, name="live-poll", daemon=True)
+                self._poller.start()
+        try:
+            channel = self.channel(production_id)
+        except Exception:
+            self._release()
+            raise
+        with channel.condition:
+            channel.listeners += 1
+        stream = self._stream(channel)
+        # Started, so closing it before the first byte still frees the slot
+        next(stream)
+        return stream
+
+    def _release(self):
+        with self._lock:
+            self.subscribers -= 1
+            if not self.subscribers:
+                self._idle.set()
+
+    def _stream(self, channel):
+        try:
+            yield None
+            seen = channel.version
+            yield f"retry: {RETRY_MS}\n\n".encode() + channel.message
+            while True:
+                with channel.condition:
+                    channel.condition.wait_for(lambda: channel.version != seen, timeout=self.heartbeat)
+                    version, message = channel.version, channel.message
+                if version != seen:
+                    seen = version
+                    yield message
+                else:
+                    yield HEARTBEAT
+        finally:
+            with channel.condition:
+                channel.listeners -= 1
+            self._release()
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+""" Musical request instrumentation """
+
+import json, threading, time
+from flask import Response, before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+# Request latency buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one series per label"""
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.setdefault(label, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {n}')
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{endpoint="{label}"}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{endpoint="{label}"}} {series["count"]}')
+        return "\n".join(lines)
+
+
+class RequestMetrics:
+    """Timings of one request, kept until it is recorded"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql = []
+        self.template = 0.0
+        self.render_start = None
+        # Set once a streamed response is returned; its body runs after teardown
+        self.streaming = False
+
+
+class Instrumentation:
+    """Per-request wall, SQL and template timings.
+
+    Enabled with INSTRUMENTATION=True. Adds a Server-Timing header and a JSON
+    log line per request, exposes /metrics when METRICS_ENDPOINT is set, and
+    logs every SQL statement of requests slower than SLOW_REQUEST_MS.
+    A streamed response is recorded when it closes, after its body ran its
+    queries; its headers are gone by then, so it has no Server-Timing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.request_seconds = Histogram("musical_request_seconds", "Request wall time")
+        self.sql_seconds = Histogram("musical_sql_seconds", "SQL time per request")
+        self.sql_statements = Histogram(
+            "musical_sql_statements", "SQL statements per request",
+            buckets=(1, 2, 3, 5, 10, 25, 50, 100),
+        )
+
+    def init_app(self, app, engine):
+        self.enabled = bool(app.config.get("INSTRUMENTATION", False))
+        if not self.enabled:
+            return
+        self.slow_ms = float(app.config.get("SLOW_REQUEST_MS", 500))
+        app.extensions["instrumentation"] = self
+
+        self.watch(engine)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        if app.config.get("METRICS_ENDPOINT", False):
+            app.add_url_rule("/metrics", "metrics", self.metrics)
+
+    def watch(self, engine):
+        """Time the statements of another engine, such as a tenant's"""
+        if self.enabled:
+            event.listen(engine, "before_cursor_execute", self._before_cursor)
+            event.listen(engine, "after_cursor_execute", self._after_cursor)
+            event.listen(engine, "handle_error", self._cursor_error)
+
+    # --- Hooks ---
+
+    def _before_request(self):
+        g.metrics = RequestMetrics()
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        if has_request_context() and "metrics" in g:
+            g.metrics.sql.append((statement, elapsed))
+
+    def _cursor_error(self, context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get("metrics_start"):
+            context.connection.info["metrics_start"].pop()
+
+    def _before_render(self, sender, template, context, **extra):
+        if has_request_context() and "metrics" in g:
+            g.metrics.render_start = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        if has_request_context() and "metrics" in g and g.metrics.render_start is not None:
+            g.metrics.template += time.perf_counter() - g.metrics.render_start
+
+    def _after_request(self, response):
+        if "metrics" not in g:
+            return response
+        metrics = g.metrics
+        details = (request.endpoint or "unknown", request.method, request.path, response.status_code)
+
+        if response.is_streamed:
+            metrics.streaming = True
+            app = current_app._get_current_object()
+
+            def record():
+                with app.app_context():
+                    self._record(metrics, *details, None)
+
+            response.call_on_close(record)
+            return response
+
+        wall = time.perf_counter() - metrics.start
+        sql_time = sum(elapsed for _, elapsed in metrics.sql)
+        response.headers["Server-Timing"] = ", ".join([
+            f"app;dur={wall * 1000:.1f}",
+            f'db;dur={sql_time * 1000:.1f};desc="{len(metrics.sql)} queries"',
+            f"tpl;dur={metrics.template * 1000:.1f}",
+        ])
+        self._record(metrics, *details, response.calculate_content_length())
+        return response
+
+    def _teardown_request(self, exc):
+        # Also runs when the view raised and no response was recorded
+        metrics = g.get("metrics")
+        if metrics is not None and not metrics.streaming:
+            g.pop("metrics")
+
+    def _record(self, metrics, endpoint, method, path, status, size):
+        wall = time.perf_counter() - metrics.start
+        sql_time = sum(elapsed for _, elapsed in metrics.sql)
+
+        self.request_seconds.observe(endpoint, wall)
+        self.sql_seconds.observe(endpoint, sql_time)
+        self.sql_statements.observe(endpoint, len(metrics.sql))
+
+        current_app.logger.info(json.dumps({
+            "endpoint": endpoint,
+            "method": method,
+            "path": path,
+            "status": status,
+            "wall_ms": round(wall * 1000, 2),
+            "sql_count": len(metrics.sql),
+            "sql_ms": round(sql_time * 1000, 2),
+            "template_ms": round(metrics.template * 1000, 2),
+            "bytes": size,
+        }))
+
+        if wall * 1000 >= self.slow_ms:
+            current_app.logger.warning(
+                "Slow request %s %s (%.1f ms):\n%s",
+                method, path, wall * 1000,
+                "\n".join(f"  {elapsed * 1000:7.1f} ms  {' '.join(statement.split())}" for statement, elapsed in metrics.sql),
+            )
+
+    # --- Endpoint ---
+
+    def metrics(self):
+        body = "\n".join([
+            self.request_seconds.render(),
+            self.sql_seconds.render(),
+            self.sql_statements.render(),
+        ])
+        return Response(body + "\n", mimetype="text/plain; version=0.0.4")
+
+
+instrumentation = Instrumentation()
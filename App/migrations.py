@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+""" Musical migrations """
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+from App import db
+from App.models import Settings, CrewAssignment
+from App.search import create_search_index
+from App.analytics import build_summaries
+
+
+def create_missing_tables(connection):
+    """Create tables added to the models since the database was made"""
+    missing = [t for t in db.metadata.sorted_tables if not inspect(connection).has_table(t.name)]
+    db.metadata.create_all(connection, tables=missing)
+    return [t.name for t in missing]
+
+
+def add_missing_columns(connection):
+    """Add nullable columns added to the models to existing tables"""
+    added = []
+    for table in db.metadata.sorted_tables:
+        existing = {c["name"] for c in inspect(connection).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable and not column.primary_key:
+                type_ = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {type_}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(connection):
+    """Add indexes declared on the models to an existing database"""
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if not connection.dialect.has_index(connection, table.name, index.name):
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+
+def create_settings_row(connection):
+    """Move the active production from production.is_active to settings"""
+    if connection.execute(text("SELECT 1 FROM settings WHERE id = :id"), {"id": Settings.ROW_ID}).first():
+        return []
+
+    active_id = None
+    columns = {c["name"] for c in inspect(connection).get_columns("production")}
+    if "is_active" in columns:
+        active_id = connection.execute(
+            text("SELECT id FROM production WHERE is_active ORDER BY id LIMIT 1")
+        ).scalar()
+
+    connection.execute(
+        text("INSERT INTO settings (id, active_production_id, version) VALUES (:id, :active_id, 0)"),
+        {"id": Settings.ROW_ID, "active_id": active_id},
+    )
+    return ["settings"]
+
+
+def stale_foreign_keys(connection, table):
+    """The table's declared foreign keys whose ON DELETE differs in the database"""
+    existing = {
+        (tuple(fk["constrained_columns"]), fk["referred_table"]): fk
+        for fk in inspect(connection).get_foreign_keys(table.name)
+    }
+    stale = []
+    for constraint in table.foreign_key_constraints:
+        fk = existing.get((tuple(constraint.column_keys), constraint.referred_table.name))
+        ondelete = (fk or {}).get("options", {}).get("ondelete")
+        if (ondelete or "").upper() != (constraint.ondelete or "").upper():
+            stale.append((constraint, fk))
+    return stale
+
+def remove_dangling_rows(connection, table):
+    """Apply each ON DELETE rule to rows whose parent is already gone"""
+    for constraint in table.foreign_key_constraints:
+        (column,), (element,) = constraint.column_keys, constraint.elements
+        dangling = (
+            f"{column} IS NOT NULL AND {column} NOT IN "
+            f"(SELECT {element.column.name} FROM {constraint.referred_table.name})"
+        )
+        if (constraint.ondelete or "").upper() == "SET NULL":
+            connection.exec_driver_sql(f"UPDATE {table.name} SET {column} = NULL WHERE {dangling}")
+        elif (constraint.ondelete or "").upper() == "CASCADE":
+            connection.exec_driver_sql(f"DELETE FROM {table.name} WHERE {dangling}")
+
+def rebuild_sqlite_table(connection, table):
+    """Recreate a table from the model, the only way SQLite can change a constraint.
+
+    Needs foreign_keys off, which upgrade() arranges; otherwise dropping the
+    old table would cascade into its children.
+    """
+    columns = {c["name"] for c in inspect(connection).get_columns(table.name)}
+    shared = ", ".join(c.name for c in table.columns if c.name in columns)
+    new_name = f"{table.name}_new"
+
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {new_name}")
+    ddl = str(CreateTable(table).compile(connection)).strip()
+    connection.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {new_name} ", 1))
+    connection.exec_driver_sql(f"INSERT INTO {new_name} ({shared}) SELECT {shared} FROM {table.name}")
+    connection.exec_driver_sql(f"DROP TABLE {table.name}")
+    connection.exec_driver_sql(f"ALTER TABLE {new_name} RENAME TO {table.name}")
+    for index in table.indexes:
+        index.create(connection)
+
+def cascade_foreign_keys(connection):
+    """Give existing databases the models' ON DELETE rules"""
+    rebuilt = []
+    for table in db.metadata.sorted_tables:
+        if not inspect(connection).has_table(table.name):
+            continue
+        stale = stale_foreign_keys(connection, table)
+        if not stale:
+            continue
+
+        if connection.dialect.name == "sqlite":
+            # Rows orphaned while foreign keys were unenforced
+            remove_dangling_rows(connection, table)
+            rebuild_sqlite_table(connection, table)
+        else:
+            for constraint, fk in stale:
+                if fk and fk.get("name"):
+                    connection.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT {fk['name']}"))
+                columns = ", ".join(constraint.column_keys)
+                referred = ", ".join(element.column.name for element in constraint.elements)
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} ADD FOREIGN KEY ({columns}) "
+                    f"REFERENCES {constraint.referred_table.name} ({referred}) ON DELETE {constraint.ondelete}"
+                ))
+        rebuilt.append(f"{table.name} foreign keys")
+    return rebuilt
+
+
+def move_crew_flags(connection):
+    """Move students.is_crew into crew_assignment for the active production"""
+    if "is_crew" not in {c["name"] for c in inspect(connection).get_columns("students")}:
+        return []
+
+    active_id = connection.execute(
+        text("SELECT active_production_id FROM settings WHERE id = :id"), {"id": Settings.ROW_ID}
+    ).scalar()
+    if active_id is None:
+        flagged = connection.execute(text("SELECT 1 FROM students WHERE is_crew LIMIT 1")).first()
+        if flagged:
+            # Keep the flags until a production is active to receive them
+            return []
+    else:
+        connection.execute(
+            text(
+                f"INSERT INTO {CrewAssignment.__tablename__} (production_id, student_id) "
+                "SELECT :active_id, id FROM students WHERE is_crew AND id NOT IN "
+                f"(SELECT student_id FROM {CrewAssignment.__tablename__} WHERE production_id = :active_id)"
+            ),
+            {"active_id": active_id},
+        )
+
+    # SQLite cannot drop an indexed column
+    for index in inspect(connection).get_indexes("students"):
+        if "is_crew" in index["column_names"]:
+            connection.execute(text(f"DROP INDEX {index['name']}"))
+    connection.execute(text("ALTER TABLE students DROP COLUMN is_crew"))
+    return ["students.is_crew -> crew_assignment"]
+
+
+MIGRATIONS = [
+    create_missing_tables,
+    add_missing_columns,
+    create_missing_indexes,
+    create_settings_row,
+    cascade_foreign_keys,
+    create_search_index,
+    move_crew_flags,
+    build_summaries,
+]
+
+
+def upgrade(engine):
+    """Bring a deployed database up to the current models; safe to re-run"""
+    applied = []
+    sqlite = engine.dialect.name == "sqlite"
+    with engine.connect() as connection:
+        # SQLite ignores this pragma inside a transaction, so set it first
+        if sqlite:
+            connection.exec_driver_sql("PRAGMA foreign_keys = OFF")
+            connection.commit()
+        try:
+            with connection.begin():
+                for migration in MIGRATIONS:
+                    applied.extend(migration(connection))
+                if sqlite and connection.exec_driver_sql("PRAGMA foreign_key_check").first():
+                    raise RuntimeError("migrated database has rows with dangling foreign keys")
+        finally:
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA foreign_keys = ON")
+                connection.commit()
+    return applied
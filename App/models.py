@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 """ Musical Database """
 
-import csv, datetime, logging, pathlib, click
+import datetime, logging, pathlib, sys, click
 import sqlalchemy as sqla
-from flask import current_app
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Float, Boolean
+from flask import g
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Float, Boolean, JSON
 from sqlalchemy.orm import (
-    DeclarativeBase,
     backref,
     relationship,
     scoped_session,
@@ -16,6 +14,7 @@ from sqlalchemy.orm import (
 
 # db = SQLAlchemy()
 from App import db;
+from App.database import install_sqlite_pragmas
 
 # --- Production ---
 
@@ -32,10 +31,31 @@ class Production(db.Model):
     price = Column(Float)
     notes = Column(String)
     thanks = Column(String)
-    is_active = Column(Boolean)
+    # Song on stage now; set by the stage manager during a performance
+    current_song_id = Column(Integer)
+    # Bumped by every save that changes what the program shows
+    content_version = Column(Integer, default=0)
+
+    @property
+    def is_active(self):
+        from App.active import active_production
+        return active_production.get_id() == self.id
 
     def __repr__(self):
         return f"Production Title({self.title})"
+
+class Settings(db.Model):
+    __tablename__ = "settings"
+
+    # Single row; version changes whenever the active production does
+    ROW_ID = 1
+
+    id = Column(Integer, primary_key=True)
+    active_production_id = Column(Integer, ForeignKey("production.id", ondelete="SET NULL"))
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"Settings(Active Production-ID {self.active_production_id})"
     
 
 # --- Students and Cast ---
@@ -47,9 +67,8 @@ class Students(db.Model):
     name = Column(String(50), nullable=False)
     sex = Column(String(1))
     year = Column(String(15))
-    is_crew = Column(Boolean, default=False)
 
-    roles = relationship("Role", secondary="role_assignment", back_populates="students")
+    roles = relationship("Role", secondary="role_assignment", back_populates="students", passive_deletes=True)
 
     def __repr__(self):
         return f"Student({self.name})"
@@ -59,11 +78,11 @@ class Role(db.Model):
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String)
-    production_id = Column(Integer, ForeignKey("production.id"))
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), index=True)
     is_group = Column(Boolean, default=False)
 
-    students = relationship("Students", secondary="role_assignment", back_populates="roles")
-    songs = relationship("Song", secondary="song_assignment", back_populates="singers")
+    students = relationship("Students", secondary="role_assignment", back_populates="roles", passive_deletes=True)
+    songs = relationship("Song", secondary="song_assignment", back_populates="singers", passive_deletes=True)
 
     def __repr__(self):
         return f"Role({self.name})"
@@ -71,8 +90,8 @@ class Role(db.Model):
 class RoleAssignment(db.Model):
     __tablename__ = "role_assignment"
 
-    role_id = Column(Integer, ForeignKey("role.id"), primary_key=True)
-    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    role_id = Column(Integer, ForeignKey("role.id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True, index=True)
 
     role = relationship("Role", backref="assignments")
     student = relationship("Students", backref="roles_played")
@@ -80,6 +99,16 @@ class RoleAssignment(db.Model):
     def __repr__(self):
         return f"Role-ID ({self.role_id}), Student-ID ({self.student_id})"
 
+class CrewAssignment(db.Model):
+    __tablename__ = "crew_assignment"
+
+    # The primary key indexes a production's crew; student_id the reverse
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+    def __repr__(self):
+        return f"Production-ID ({self.production_id}), Crew Student-ID ({self.student_id})"
+
 
 # --- Adults and Creative Team ---
 
@@ -88,9 +117,9 @@ class CreativeRole(db.Model):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    production_id = Column(Integer, ForeignKey("production.id"))
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), index=True)
 
-    adults = relationship("Adult", secondary="creative_assignment", back_populates="roles")
+    adults = relationship("Adult", secondary="creative_assignment", back_populates="roles", passive_deletes=True)
 
     def __repr__(self):
         return f"Creative Role ({self.name})"
@@ -100,9 +129,9 @@ class Adult(db.Model):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    production_id = Column(Integer, ForeignKey("production.id"))
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), index=True)
 
-    roles = relationship("CreativeRole", secondary="creative_assignment", back_populates="adults")
+    roles = relationship("CreativeRole", secondary="creative_assignment", back_populates="adults", passive_deletes=True)
 
     def __repr__(self):
         return f"Adult ({self.name})"
@@ -110,8 +139,8 @@ class Adult(db.Model):
 class CreativeAssignment(db.Model):
     __tablename__ = "creative_assignment"
 
-    role_id = Column(Integer, ForeignKey("creative_role.id"), primary_key=True)
-    adult_id = Column(Integer, ForeignKey("adult.id"), primary_key=True)
+    role_id = Column(Integer, ForeignKey("creative_role.id", ondelete="CASCADE"), primary_key=True)
+    adult_id = Column(Integer, ForeignKey("adult.id", ondelete="CASCADE"), primary_key=True, index=True)
 
     role = relationship("CreativeRole")
     adult = relationship("Adult")
@@ -129,10 +158,10 @@ class Song(db.Model):
     title = Column(String, nullable=False)
     act = Column(Integer)
     intermission_message = Column(String, default="")
-    production_id = Column(Integer, ForeignKey("production.id"))
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), index=True)
 
-    production = relationship("Production", backref="songs")
-    singers = relationship("Role", secondary="song_assignment", back_populates="songs")
+    production = relationship("Production", backref=backref("songs", passive_deletes=True))
+    singers = relationship("Role", secondary="song_assignment", back_populates="songs", passive_deletes=True)
 
     def __repr__(self):
         return f"Song({self.title}, Order {self.order})"
@@ -140,8 +169,8 @@ class Song(db.Model):
 class SongAssignment(db.Model):
     __tablename__ = "song_assignment"
 
-    song_id = Column(Integer, ForeignKey("song.id"), primary_key=True)
-    role_id = Column(Integer, ForeignKey("role.id"), primary_key=True)
+    song_id = Column(Integer, ForeignKey("song.id", ondelete="CASCADE"), primary_key=True)
+    role_id = Column(Integer, ForeignKey("role.id", ondelete="CASCADE"), primary_key=True, index=True)
 
     role = relationship("Role")
     song = relationship("Song")
@@ -150,38 +179,143 @@ class SongAssignment(db.Model):
         return f"Song-ID ({self.song_id}), Role-ID ({self.role_id})"
 
 
+# --- Jobs ---
+
+class Job(db.Model):
+    __tablename__ = "job"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    production_id = Column(Integer, index=True)
+    params = Column(JSON, default=dict)
+    status = Column(String, nullable=False, default="queued", index=True)
+    progress = Column(Integer, default=0)
+    total = Column(Integer)
+    message = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    finished_at = Column(DateTime)
+    owner = Column(String)  # host:pid of the worker running it
+    heartbeat_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"Job({self.kind}, {self.status})"
+
+
+# --- Analytics ---
+# Summaries kept by App.analytics, rebuilt one production at a time
+
+class Participation(db.Model):
+    __tablename__ = "participation"
+
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True, index=True)
+    # Class year as of the production's last save, so past seasons keep theirs
+    year = Column(String(15))
+    roles = Column(Integer, nullable=False, default=0)
+    crew = Column(Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return f"Participation(Production-ID {self.production_id}, Student-ID {self.student_id})"
+
+class RoleStats(db.Model):
+    __tablename__ = "role_stats"
+
+    role_id = Column(Integer, ForeignKey("role.id", ondelete="CASCADE"), primary_key=True)
+    production_id = Column(Integer, ForeignKey("production.id", ondelete="CASCADE"), nullable=False, index=True)
+    songs = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"RoleStats(Role-ID {self.role_id}, {self.songs} songs)"
+
+
 # --- End ---
 
-def create_db(app):
-    """Create database directly (no CLI needed)"""
-    import pathlib, csv
+def add_sample_production(session):
+    """Seed a demo production so a fresh database has something to show"""
+    p = Production(
+        title="The Little Mermaid",
+        subtitle="Disney's Production",
+        image="https://upload.wikimedia.org/wikipedia/en/c/c0/The_Little_Mermaid_%28Official_1989_Film_Poster%29.png",
+        start_date=datetime.datetime(2025, 12, 10),
+        end_date=datetime.datetime(2025, 12, 12),
+        location="CFL Building, Luther College, Decorah, Iowa",
+        price=10.0,
+        notes="Photography and Videography are strictly prohibited!",
+        thanks="Thank You for your time! We hope you liked our musical.",
+    )
+    session.add(p)
+    session.flush()
+
+    r = Role(name="Ariel", production_id=p.id)
+    a = Adult(name="Abdullah", production_id=p.id)
+    cr = CreativeRole(name="Technology Lead", production_id=p.id)
+    s = Song(title="The World Above", act=1, production_id=p.id)
+    session.add_all([r, a, cr, s])
+    session.flush()
+
+    session.add_all([
+        RoleAssignment(role_id=r.id, student_id=1),
+        CreativeAssignment(role_id=cr.id, adult_id=a.id),
+        SongAssignment(song_id=s.id, role_id=r.id),
+    ])
+
+    session.add_all(
+        CrewAssignment(production_id=p.id, student_id=student_id)
+        for student_id in session.scalars(sqla.select(Students.id).filter(Students.id.in_([10, 20, 30]))).all()
+    )
+
+    session.execute(
+        sqla.update(Settings)
+        .where(Settings.id == Settings.ROW_ID)
+        .values(active_production_id=p.id, version=Settings.version + 1)
+    )
+    session.commit()
+
+
+def seed_db(app, tenant=None):
+    """Load the bundled roster and the demo production into a new database"""
+    with app.app_context():
+        g.tenant = tenant
+
+        from App.roster import import_roster
+        this_dir = pathlib.Path(__file__).parent
+        data_file = this_dir.parent / "Data" / "cast.csv"
+        with db.engine.begin() as connection:
+            import_roster(connection, data_file)
 
-    db_file = app.config.get("SQLALCHEMY_DATABASE_URI").replace("sqlite:///", "")
-    db_path = pathlib.Path(db_file)
+        add_sample_production(db.session)
 
-    # Delete existing DB
-    if db_path.exists():
-        db_path.unlink()
 
+def create_db(app, tenant=None, seed=False):
+    """Create database directly (no CLI needed); tenant selects an organization's file.
+
+    A new database has only its tables and settings row; seed adds the
+    bundled roster and demo production.
+    """
     # Wrap DB creation and session in app context
     with app.app_context():
-        # Build tables
+        g.tenant = tenant
+
+        # Delete existing DB, and the snapshot published from it
+        from App.snapshots import snapshot_path
+        db_path = pathlib.Path(db.engine.url.database)
+        db.engine.dispose()
+        if db_path.exists():
+            db_path.unlink()
+        published_path = snapshot_path(db.engine)
+        if published_path is not None:
+            published_path.unlink(missing_ok=True)
+
+        # Build tables, and the search index before any student is added
+        from App.search import create_search_index
         db.create_all()
+        with db.engine.begin() as connection:
+            create_search_index(connection)
+        db.session.add(Settings(id=Settings.ROW_ID))
+        db.session.commit()
 
-        # Add initial data from CSV
-        session = db.session
-        this_dir = pathlib.Path(__file__).parent
-        data_file = this_dir.parent / "Data" / "cast.csv"
-        with open(data_file, "r", encoding="utf8") as f:
-            content = csv.DictReader(f)
-            for item in content:
-                student = Students(
-                    name=item["name"],
-                    sex=item["sex"],
-                    year=item["year"]
-                )
-                session.add(student)
-            session.commit()
+    if seed:
+        seed_db(app, tenant)
 
     print("Database created successfully.")
 
@@ -191,33 +325,50 @@ def create_db(app):
 def create(ctx) -> None:
     """Create database"""
     engine = ctx.obj["engine"]
-    session = ctx.obj["session"]
     filename = ctx.obj["filename"]
 
     # Delete existing DB
     if pathlib.Path(f"{filename}.sqlite3").exists():
         pathlib.Path(f"{filename}.sqlite3").unlink()
 
-    # Build tables
+    # Build tables and the search index
+    from App.search import create_search_index
     db.metadata.create_all(engine)
 
     # Add data
+    from App.roster import import_roster
     this_dir = pathlib.Path(__file__).parent
     data_file = this_dir.parent / "Data" / "cast.csv"
-    with open(data_file, "r", encoding="utf8") as f:
-        content = csv.DictReader(f, delimiter=",")
-        for item in content:
-            student = Students(
-                name = item["name"],
-                sex = item["sex"],
-                year = item["year"],
-            )
-            session.add(student)
-        session.commit()
+    with engine.begin() as connection:
+        create_search_index(connection)
+        import_roster(connection, data_file)
 
     print("Database created successfully.")
 
 
+@click.command(name="import", help="Import or update students from a roster CSV")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=500, show_default=True, help="Rows per batch")
+@click.pass_context
+def import_csv(ctx, csv_file: str, chunk_size: int) -> None:
+    """Import roster"""
+    from App.roster import import_roster
+    engine = ctx.obj["engine"]
+
+    # Upserts match on name and year, so make sure the tables exist first
+    db.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        result = import_roster(
+            connection, csv_file, chunk_size=chunk_size,
+            progress=lambda n: logging.info("%d rows imported", n),
+        )
+
+    for line, error in result.rejected:
+        print(f"Line {line}: {error}")
+    print(f"{result.inserted} added, {result.updated} updated, {len(result.rejected)} rejected.")
+
+
 @click.command(help="Read all records from the database")
 @click.pass_context
 def read(ctx) -> None:
@@ -230,6 +381,78 @@ def read(ctx) -> None:
         print(f"{s.name:10s}{s.sex:10s}{s.year:10s}")
 
 
+@click.command(help="Report participation across all productions")
+@click.option("--limit", default=20, show_default=True, help="Students to list")
+@click.pass_context
+def analytics(ctx, limit: int) -> None:
+    """Read analytics"""
+    from App.analytics import student_shows, roles_by_year, songs_per_role
+    from App.migrations import upgrade
+    session = ctx.obj["session"]
+
+    # A database made before the summaries, or the crew tables they read,
+    # is upgraded first; the upgrade builds the missing summaries
+    upgrade(ctx.obj["engine"])
+
+    print(f"{'name':25s}{'year':15s}{'shows':>6s}{'roles':>6s}{'crew':>6s}")
+    for s in student_shows(session, limit):
+        print(f"{s.name:25s}{s.year or '':15s}{s.shows:6d}{s.roles:6d}{s.crew:6d}")
+
+    print(f"\n{'season':8s}{'production':30s}{'year':15s}{'students':>9s}{'roles':>6s}")
+    for r in roles_by_year(session):
+        print(f"{str(r.season or ''):8s}{r.title[:29]:30s}{r.year or '':15s}{r.students:9d}{r.roles:6d}")
+
+    print(f"\n{'season':8s}{'production':30s}{'roles':>6s}{'songs':>6s}{'avg':>6s}{'most':>6s}")
+    for r in songs_per_role(session):
+        print(f"{str(r.season or ''):8s}{r.title[:29]:30s}{r.roles:6d}{r.songs:6d}{r.average:6.1f}{r.most:6d}")
+
+
+@click.command(help="Export a production's program as static, precompressed HTML")
+@click.argument("production_id", type=int)
+@click.option("--out", "-o", "out_dir", default="export", show_default=True, help="Output directory")
+@click.pass_context
+def export(ctx, production_id: int, out_dir: str) -> None:
+    """Export production"""
+    from App import create_app
+    from App.export import export_production
+    from App.snapshots import published
+
+    engine = ctx.obj["engine"]
+    app = create_app({"SQLALCHEMY_DATABASE_URI": engine.url.render_as_string(hide_password=False)})
+    # The export renders the published program, so look for it there
+    with published(app):
+        if db.session.get(Production, production_id) is None:
+            raise click.ClickException(f"no production {production_id}")
+    written = export_production(app, production_id, out_dir)
+
+    for path in written:
+        print(f"Wrote {path}")
+    print(f"{len(written)} page(s) changed.")
+
+
+@click.command(help="Add missing indexes and other schema changes to an existing database")
+@click.pass_context
+def migrate(ctx) -> None:
+    """Upgrade database"""
+    from App.migrations import upgrade
+    from App.snapshots import snapshots
+    applied = upgrade(ctx.obj["engine"])
+    applied += [f"{name} (published)" for name in snapshots.migrate(ctx.obj["engine"])]
+
+    for name in applied:
+        print(f"Applied {name}")
+    print(f"{len(applied)} change(s) applied.")
+
+
+@click.command(help="Publish the database as the read-only snapshot the view pages read")
+@click.pass_context
+def publish(ctx) -> None:
+    """Publish snapshot"""
+    from App.snapshots import snapshots
+    path = snapshots.publish(ctx.obj["engine"])
+    print(f"Published {path}")
+
+
 @click.group()
 @click.option("--verbose", "-v", is_flag=True, default=False)
 @click.argument("filename")
@@ -243,7 +466,8 @@ def cli(ctx, verbose: bool, filename: str) -> None:
     this_dir = pathlib.Path(__file__).parent
     data_dir = this_dir.parent / "Data"
 
-    engine = sqla.create_engine(f"sqlite:////{data_dir}/{filename}.sqlite3")
+    engine = sqla.create_engine(f"sqlite:///{data_dir}/{filename}.sqlite3")
+    install_sqlite_pragmas(engine)
     session = scoped_session(sessionmaker(bind=engine))
 
     ctx.obj["session"] = session
@@ -254,7 +478,14 @@ def main():
     """Main function"""
     cli.add_command(create)
     cli.add_command(read)
+    cli.add_command(analytics)
+    cli.add_command(import_csv)
+    cli.add_command(export)
+    cli.add_command(migrate)
+    cli.add_command(publish)
     cli()
 
 if __name__ == "__main__":
+    # Let App.routes reuse these models instead of defining them twice
+    sys.modules.setdefault("App.models", sys.modules[__name__])
     main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+""" Musical queries """
+
+from itertools import groupby
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+
+from App.models import Production, Students, Role, CrewAssignment, CreativeRole, CreativeAssignment, Song
+
+# Each loader returns a page's full object graph in a fixed number of
+# statements, so the templates never lazy-load a relationship.
+
+# --- View Pages ---
+
+def production_page(production_id):
+    """Production for the general and thanks pages (1 statement)"""
+    return Production.query.get_or_404(production_id)
+
+def cast_page(production_id):
+    """Roles with their students (2 statements)"""
+    return (
+        Role.query
+        .filter_by(production_id=production_id)
+        .options(selectinload(Role.students))
+        .all()
+    )
+
+def production_crew(production_id):
+    """The production's crew students by name (1 statement)"""
+    return (
+        Students.query
+        .join(CrewAssignment, CrewAssignment.student_id == Students.id)
+        .filter(CrewAssignment.production_id == production_id)
+        .order_by(Students.name, Students.id)
+        .all()
+    )
+
+def team_page(production_id):
+    """Crew students and the production's creative assignments (2 statements)"""
+    crew = production_crew(production_id)
+    team = (
+        CreativeAssignment.query
+        .join(CreativeAssignment.role)
+        .filter(CreativeRole.production_id == production_id)
+        .options(
+            contains_eager(CreativeAssignment.role),
+            joinedload(CreativeAssignment.adult),
+        )
+        .order_by(CreativeRole.id, CreativeAssignment.adult_id)
+        .all()
+    )
+    return crew, team
+
+def songs_page(production_id):
+    """The production's songs with singers, as [(act, songs)] in running order (2 statements)"""
+    songs = (
+        Song.query
+        .filter_by(production_id=production_id)
+        .options(selectinload(Song.singers))
+        .order_by(Song.act.is_(None), Song.act, Song.id)
+        .all()
+    )
+    return [(act, list(group)) for act, group in groupby(songs, key=lambda song: song.act)]
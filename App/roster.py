@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+""" Musical roster import """
+
+import csv
+from collections import namedtuple
+from sqlalchemy import bindparam, insert, select, tuple_, update
+
+from App.models import Students
+
+ImportResult = namedtuple("ImportResult", ["inserted", "updated", "rejected"])
+
+students = Students.__table__
+
+
+# --- Reading ---
+
+def validate(item):
+    """Return a clean student row, or raise ValueError"""
+    name = (item.get("name") or "").strip()
+    sex = (item.get("sex") or "").strip() or None
+    year = (item.get("year") or "").strip() or None
+
+    if not name:
+        raise ValueError("missing name")
+    if len(name) > students.c.name.type.length:
+        raise ValueError(f"name longer than {students.c.name.type.length} characters")
+    if sex is not None and len(sex) > students.c.sex.type.length:
+        raise ValueError(f"sex must be a single letter, got {sex!r}")
+    if year is not None and len(year) > students.c.year.type.length:
+        raise ValueError(f"year longer than {students.c.year.type.length} characters")
+
+    return {"name": name, "sex": sex, "year": year}
+
+def read_chunks(f, chunk_size, rejected):
+    """Yield lists of valid rows, appending (line, error) for invalid ones"""
+    content = csv.DictReader(f, delimiter=",")
+    chunk = {}
+    for item in content:
+        try:
+            row = validate(item)
+        except ValueError as e:
+            rejected.append((content.line_num, str(e)))
+            continue
+
+        # Later rows for the same student win
+        chunk[(row["name"], row["year"])] = row
+        if len(chunk) >= chunk_size:
+            yield list(chunk.values())
+            chunk = {}
+    if chunk:
+        yield list(chunk.values())
+
+
+# --- Writing ---
+
+def write_chunk(connection, rows):
+    """Upsert one chunk by (name, year); returns (inserted, updated).
+
+    Rows that match a student whose sex is already the same are left alone.
+    """
+    keys = [(r["name"], r["year"]) for r in rows]
+    existing = dict(
+        ((name, year), (id_, sex))
+        for id_, name, year, sex in connection.execute(
+            select(students.c.id, students.c.name, students.c.year, students.c.sex)
+            .where(tuple_(students.c.name, students.c.year).in_(keys))
+        )
+    )
+    # NULL years never match IN, so look them up separately
+    null_names = [r["name"] for r in rows if r["year"] is None]
+    if null_names:
+        for id_, name, sex in connection.execute(
+            select(students.c.id, students.c.name, students.c.sex)
+            .where(students.c.name.in_(null_names), students.c.year.is_(None))
+        ):
+            existing[(name, None)] = (id_, sex)
+
+    new_rows = [r for r in rows if (r["name"], r["year"]) not in existing]
+    old_rows = [
+        {"student_id": existing[(r["name"], r["year"])][0], "new_sex": r["sex"]}
+        for r in rows
+        if (r["name"], r["year"]) in existing and existing[(r["name"], r["year"])][1] != r["sex"]
+    ]
+
+    if new_rows:
+        connection.execute(insert(students), new_rows)
+    if old_rows:
+        connection.execute(
+            update(students)
+            .where(students.c.id == bindparam("student_id"))
+            .values(sex=bindparam("new_sex")),
+            old_rows,
+        )
+    return len(new_rows), len(old_rows)
+
+def copy_chunk(connection, rows):
+    """Upsert one chunk on Postgres via COPY into a staging table"""
+    with connection.connection.driver_connection.cursor() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS students_import "
+            "(name text, sex text, year text) ON COMMIT DROP"
+        )
+        cur.execute("TRUNCATE students_import")
+        with cur.copy("COPY students_import (name, sex, year) FROM STDIN") as copy:
+            for r in rows:
+                copy.write_row((r["name"], r["sex"], r["year"]))
+
+        cur.execute(
+            "UPDATE students s SET sex = i.sex FROM students_import i "
+            "WHERE s.name = i.name AND s.year IS NOT DISTINCT FROM i.year "
+            "AND s.sex IS DISTINCT FROM i.sex"
+        )
+        updated = cur.rowcount
+        cur.execute(
+            "INSERT INTO students (name, sex, year) "
+            "SELECT i.name, i.sex, i.year FROM students_import i "
+            "WHERE NOT EXISTS (SELECT 1 FROM students s "
+            "WHERE s.name = i.name AND s.year IS NOT DISTINCT FROM i.year)"
+        )
+        inserted = cur.rowcount
+    return inserted, updated
+
+
+def import_roster(connection, csv_path, chunk_size=500, progress=None) -> ImportResult:
+    """Stream a roster CSV into students, upserting by name and year.
+
+    Runs on the caller's connection; wrap it in engine.begin() so the whole
+    import is one transaction. progress, if given, is called with the number
+    of rows imported so far after each chunk, counting those already up to
+    date; updated counts only students whose row changed.
+    """
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg":
+        write = copy_chunk
+    else:
+        write = write_chunk
+
+    inserted = updated = done = 0
+    rejected = []
+    with open(csv_path, "r", encoding="utf8", newline="") as f:
+        for rows in read_chunks(f, chunk_size, rejected):
+            i, u = write(connection, rows)
+            inserted += i
+            updated += u
+            done += len(rows)
+            if progress:
+                progress(done)
+
+    return ImportResult(inserted, updated, rejected)
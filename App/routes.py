@@ -1,96 +1,154 @@
 #!/usr/bin/env python3
 """ Musical routes """
 
+import uuid
 from datetime import datetime
-from flask import Blueprint, current_app, redirect, render_template, request, url_for
+from flask import Blueprint, Response, abort, current_app, g, jsonify, redirect, render_template, request, stream_template, send_from_directory, url_for
+from sqlalchemy.orm import selectinload
 
 view = Blueprint("view", __name__, url_prefix="/view")
 edit = Blueprint("edit", __name__, url_prefix="/edit")
 
 from App import db;
-from App.models import Production, Students, Role, RoleAssignment, CreativeRole, Adult, CreativeAssignment, Song, SongAssignment
-
-# --- Add Rows ---
-def add():
-    p = Production(
-        title="The Little Mermaid",
-        subtitle="Disney's Production",
-        image="https://upload.wikimedia.org/wikipedia/en/c/c0/The_Little_Mermaid_%28Official_1989_Film_Poster%29.png",
-        start_date=datetime(2025, 12, 10),
-        end_date=datetime(2025, 12, 12),
-        location="CFL Building, Luther College, Decorah, Iowa",
-        price=10.0,
-        notes="Photography and Videography are strictly prohibited!",
-        thanks="Thank You for your time! We hope you liked our musical.",
-        is_active=True
-    )
-    db.session.add(p)
-    db.session.commit()
-
-    r = Role(name="Ariel", production_id=p.id)
-    db.session.add(r)
-    db.session.commit()
+from App.models import Production, Students, Role, RoleAssignment, CrewAssignment, CreativeRole, Adult, CreativeAssignment, Song, SongAssignment, Job
+from App import analytics, images, queries
+from App.cache import cached_page, page_cache, streamed_page
+from App.assignments import sync_assignments
+from App.active import active_production
+from App.api import documents, json_response
+from App.jobs import jobs, upload_dir
+from App.search import DEFAULT_PER_PAGE, MAX_PER_PAGE, search_students
+from App.live import broadcaster, running_order
+from App.snapshots import snapshots
+
+# --- Page Rendering ---
+
+def render_general(production_id):
+    production = queries.production_page(production_id)
+    return render_template("view/general.jinja", production=production)
 
-    ra = RoleAssignment(role_id=r.id, student_id=1)
-    db.session.add(ra)
+def render_cast(production_id):
+    production = queries.production_page(production_id)
+    roles = queries.cast_page(production.id)
+    return render_template("view/cast.jinja", roles=roles, production=production)
 
-    a = Adult(name="Abdullah", production_id=p.id)
-    cr = CreativeRole(name="Technology Lead", production_id=p.id)
-    db.session.add_all([a, cr])
-    db.session.commit()
+def render_team(production_id):
+    production = queries.production_page(production_id)
+    crew, team = queries.team_page(production.id)
+    return render_template("view/team.jinja", crew=crew, team=team, production=production)
 
-    ca = CreativeAssignment(role_id=cr.id, adult_id=a.id)
-    db.session.add(ca)
+def render_songs(production_id):
+    production = queries.production_page(production_id)
+    acts = queries.songs_page(production.id)
+    return render_template("view/songs.jinja", acts=acts, production=production)
 
-    s = Song(title="The World Above", act=1, production_id=p.id)
-    db.session.add(s)
-    db.session.commit()
+def render_thanks(production_id):
+    production = queries.production_page(production_id)
+    return render_template("view/thanks.jinja", production=production)
 
-    sa = SongAssignment(song_id=s.id, role_id=r.id)
-    db.session.add(sa)
+def stream_print(production_id):
+    """The whole program in one document (7 statements).
+
+    The production loads first, so a missing one is a 404 before any
+    bytes are sent; the other sections load as the stream reaches them.
+    """
+    production = queries.production_page(production_id)
+    return stream_template(
+        "view/print.jinja",
+        production=production,
+        load_cast=lambda: queries.cast_page(production.id),
+        load_team=lambda: queries.team_page(production.id),
+        load_songs=lambda: queries.songs_page(production.id),
+    )
 
-    for student_id in [10, 20, 30]:
-        student = Students.query.filter_by(id=student_id).first()
-        if student:
-            student.is_crew = True
+def render_print(production_id):
+    return "".join(stream_print(production_id))
 
-    db.session.commit()
+PAGES = {
+    "general": render_general,
+    "cast": render_cast,
+    "team": render_team,
+    "songs": render_songs,
+    "thanks": render_thanks,
+    "print": render_print,
+}
 
 
 # --- View Routes ---
 
+@view.before_request
+def read_published():
+    # The song on stage is live, not published, and ?draft=1 previews the
+    # editors' saves before they are published
+    if request.endpoint != "view.live" and not request.args.get("draft"):
+        g.published = True
+        # Resolving the engine notices a newly published snapshot and empties
+        # the page cache, before a cached page could be served
+        db.engine
+
+@view.context_processor
+def draft_preview():
+    return {"draft": not g.get("published", False)}
+
 @view.get("/")
 def general():
-    production = Production.query.filter_by(is_active=True).first()
-    if not production:
-        add()
-        production = Production.query.first()
-
-    return render_template("view/general.jinja", production=production)
+    production_id = active_production.get_id()
+    if production_id is None:
+        abort(404)
+
+    return cached_page(production_id, "general", lambda: render_general(production_id))
+
+@view.get("/sw.js")
+def service_worker():
+    # Served under /view/ so the worker's scope covers the program pages
+    response = current_app.send_static_file("sw.js")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@view.get("/images/<path:filename>")
+def image(filename):
+    # Names are content hashes, so a stored variant never changes
+    response = send_from_directory(images.image_dir(), filename, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@view.app_context_processor
+def image_helpers():
+    return {"image_sources": images.image_sources}
 
 @view.get("/<int:production_id>/cast")
 def cast(production_id):
-    production = Production.query.get(production_id)
-    roles = Role.query.filter_by(production_id=production.id).all()
-
-    return render_template("view/cast.jinja", roles=roles, production=production)
+    return cached_page(production_id, "cast", lambda: render_cast(production_id))
 
 @view.get("/<int:production_id>/team")
 def team(production_id):
-    crew = Students.query.filter_by(is_crew=True).all()
-    team = CreativeAssignment.query.all()
-
-    return render_template("view/team.jinja", crew=crew, team=team)
+    return cached_page(production_id, "team", lambda: render_team(production_id))
 
 @view.get("/<int:production_id>/songs")
 def songs(production_id):
-    song_list = SongAssignment.query.all()
-    return render_template("view/songs.jinja", song_list=song_list)
+    return cached_page(production_id, "songs", lambda: render_songs(production_id))
     
 @view.get("/<int:production_id>/thanks")
 def thanks(production_id):
-    production = Production.query.get(production_id)
-    return render_template("view/thanks.jinja", production=production)
+    return cached_page(production_id, "thanks", lambda: render_thanks(production_id))
+
+@view.get("/<int:production_id>/print")
+def print_program(production_id):
+    return streamed_page(production_id, "print", lambda: stream_print(production_id))
+
+@view.get("/<int:production_id>/live")
+def live(production_id):
+    """Server-sent events naming the song on stage"""
+    queries.production_page(production_id)
+    stream = broadcaster.subscribe(production_id)
+    if stream is None:
+        return Response("Too many live connections", status=503, headers={"Retry-After": "30"})
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Let nginx and similar proxies pass each event through
+        "X-Accel-Buffering": "no",
+    })
 
 
 # --- Edit Routes ---
@@ -102,11 +160,18 @@ def edit_all():
 
 @edit.post("/all")
 def save_all():
-    active_id = request.form.get("active_production")
-    for prod in Production.query.all():
-        prod.is_active = (str(prod.id) == active_id)
-    db.session.commit()
-    return redirect("/view/")
+    new_id = request.form.get("active_production", type=int)
+    if request.form.get("active_production") and (new_id is None or db.session.get(Production, new_id) is None):
+        abort(400)
+    old_id = active_production.get_id()
+    if new_id != old_id:
+        active_production.set(new_id)
+        db.session.commit()
+    if request.form.get("publish"):
+        # Workers see the new snapshot's inode and drop the pages of the productions it changed
+        snapshots.publish(db.engine)
+        return redirect("/view/")
+    return redirect("/view/?draft=1")
 
 
 @edit.get("/<int:production_id>/aspects")
@@ -132,21 +197,11 @@ def save_general(production_id):
     production = Production.query.get_or_404(production_id)
 
     if request.form.get("delete_production"):
-        SongAssignment.query.filter(SongAssignment.song.has(production_id=production.id)).delete(synchronize_session=False)
-        Song.query.filter_by(production_id=production.id).delete()
-        RoleAssignment.query.filter(RoleAssignment.role.has(production_id=production.id)).delete(synchronize_session=False)
-        Role.query.filter_by(production_id=production.id).delete()
-        CreativeAssignment.query.filter(CreativeAssignment.role.has(production_id=production.id)).delete(synchronize_session=False)
-        CreativeRole.query.filter_by(production_id=production.id).delete()
-        Adult.query.filter_by(production_id=production.id).delete()
-
-        db.session.delete(production)
-        db.session.commit()
-        return redirect("/edit/all")
+        return job_response(jobs.submit("delete_production", production.id), "/edit/all")
 
     production.title = request.form["title"]
     production.subtitle = request.form["subtitle"]
-    production.image = request.form["image"]
+    production.image = store_poster(production.image, request.form["image"], request.files.get("image_file"))
     production.location = request.form["location"]
     production.price = request.form["price"]
     production.notes = request.form["notes"]
@@ -159,19 +214,35 @@ def save_general(production_id):
     production.end_date   = parse_date(request.form["end_date"])
 
     is_active = request.form.get("is_active") == "on"
-    production.is_active = is_active
+    if is_active != production.is_active:
+        active_production.set(production.id if is_active else None)
 
+    page_cache.changed(production_id)
     db.session.commit()
+    page_cache.saved(production_id)
+    documents.saved(production_id, ["production"])
     return redirect("/edit/all")
 
 
+def store_poster(current, url, upload):
+    """Ingest an uploaded or newly linked poster; keeps the URL if that fails"""
+    try:
+        if upload and upload.filename:
+            return images.ingest(upload.read())
+        if url != current and url.startswith(("http://", "https://")):
+            return images.ingest(images.download(url))
+    except Exception as e:
+        current_app.logger.warning("Could not store poster %s: %s", url or upload.filename, e)
+    return url
+
+
 @edit.get("/<int:production_id>/cast")
 def edit_cast(production_id):
     production = Production.query.get(production_id)
-    roles = Role.query.filter_by(production_id=production.id).all()
-    students = Students.query.filter_by(is_crew=False).all()
+    roles = Role.query.filter_by(production_id=production.id).options(selectinload(Role.students)).all()
 
-    return render_template("edit/cast.jinja", production=production, roles=roles, students=students)
+    # Only current assignments are rendered; the pickers search for the rest
+    return render_template("edit/cast.jinja", production=production, roles=roles)
 
 @edit.post("/<int:production_id>/cast")
 def save_cast(production_id):
@@ -187,54 +258,72 @@ def save_cast(production_id):
         )
         db.session.add(new_role)
 
+    deleted_ids = []
     delete_id = request.form.get("delete_role")
-    if delete_id:
-        Role.query.filter_by(id=delete_id).delete()
+    if delete_id and Role.query.filter_by(id=int(delete_id), production_id=production.id).delete():
+        deleted_ids.append(int(delete_id))
 
     roles = Role.query.filter_by(production_id=production.id).all()
 
+    desired = set()
     for role in roles:
         new_name = request.form.get(f"role_name_{role.id}")
         if new_name:
             role.name = new_name
 
         selected_ids = request.form.getlist(f"role_students_{role.id}[]")
-        role.students = Students.query.filter(Students.id.in_(selected_ids)).all()
+        desired.update((role.id, int(s_id)) for s_id in selected_ids)
+
+    if name:
+        new_role_students = request.form.getlist("new_role_students[]")
+        desired.update((new_role.id, int(s_id)) for s_id in new_role_students)
+
+    # Drop ids for students that no longer exist
+    student_ids = {s_id for _, s_id in desired}
+    if student_ids:
+        known = set(db.session.scalars(db.select(Students.id).where(Students.id.in_(student_ids))))
+        desired = {pair for pair in desired if pair[1] in known}
 
-    new_role_students = request.form.getlist("new_role_students[]")
-    for s_id in new_role_students:
-        assignment = RoleAssignment(role_id=new_role.id, student_id=int(s_id))
-        db.session.add(assignment)
+    # The deleted role stays in scope so its assignments are removed too
+    scope = [role.id for role in roles] + deleted_ids
+    sync_assignments(RoleAssignment.__table__, "role_id", "student_id", scope, desired)
+    analytics.refresh(db.session, production_id)
 
+    page_cache.changed(production_id)
     db.session.commit()
-    return redirect("/view/cast")
+    page_cache.saved(production_id)
+    # Songs list their singers by role name
+    documents.saved(production_id, ["cast", "songs"])
+    return redirect(f"/view/{production_id}/cast?draft=1")
 
 
 @edit.get("/<int:production_id>/team")
 def edit_team(production_id):
-    students = Students.query.all()
+    crew = queries.production_crew(production_id)
     roles = CreativeRole.query.filter_by(production_id=production_id).all()
     adults = Adult.query.filter_by(production_id=production_id).all()
 
-    return render_template("edit/team.jinja", production_id=production_id, students=students, roles=roles, adults=adults)
+    return render_template("edit/team.jinja", production_id=production_id, crew=crew, roles=roles, adults=adults)
 
 @edit.post("/<int:production_id>/team")
 def save_team(production_id):
     roles = CreativeRole.query.filter_by(production_id=production_id).all()
 
-    new_crew_students = request.form.getlist("new_crew_students[]")
-    if new_crew_students:
-        crew_ids = set(map(int, new_crew_students))
-        for student in Students.query.all():
-            student.is_crew = True if student.id in crew_ids else False
-        db.session.commit()
+    # An empty selection empties the crew; the field tells it from a form without the picker
+    if request.form.get("crew_form"):
+        crew_ids = set(map(int, request.form.getlist("new_crew_students[]")))
+        known = set(db.session.scalars(db.select(Students.id).where(Students.id.in_(crew_ids)))) if crew_ids else set()
+        sync_assignments(CrewAssignment.__table__, "production_id", "student_id",
+                         [production_id], {(production_id, s_id) for s_id in known})
 
     new_adult_name = request.form.get("new_adult_name")
     if new_adult_name:
         new_adult = Adult(name=new_adult_name, production_id=production_id)
         db.session.add(new_adult)
         db.session.flush()
-        
+
+    desired = set()
+    deleted_ids = []
     new_role_name = request.form.get("new_role_name")
     if new_role_name:
         new_role = CreativeRole(name=new_role_name, production_id=production_id)
@@ -242,28 +331,39 @@ def save_team(production_id):
         db.session.flush() 
 
         new_role_adults = request.form.getlist("new_role_adults[]")
-        for aid in new_role_adults:
-            db.session.add(CreativeAssignment(role_id=new_role.id, adult_id=int(aid)))
+        desired.update((new_role.id, int(aid)) for aid in new_role_adults)
 
     delete_id = request.form.get("delete_role")
     if delete_id:
-        role_to_delete = CreativeRole.query.get(int(delete_id))
+        role_to_delete = CreativeRole.query.filter_by(id=int(delete_id), production_id=production_id).first()
         if role_to_delete:
-            CreativeAssignment.query.filter_by(role_id=role_to_delete.id).delete()
+            deleted_ids.append(role_to_delete.id)
             db.session.delete(role_to_delete)
             
     for role in roles:
+        if role.id in deleted_ids:
+            continue
+
         new_name = request.form.get(f"role_name_{role.id}")
         if new_name:
             role.name = new_name
             
         selected_adults = request.form.getlist(f"role_adults_{role.id}[]")
-        CreativeAssignment.query.filter_by(role_id=role.id).delete()
-        for aid in selected_adults:
-            db.session.add(CreativeAssignment(role_id=role.id, adult_id=int(aid)))
+        desired.update((role.id, int(aid)) for aid in selected_adults)
 
+    # Only this production's adults can fill its positions
+    adult_ids = set(db.session.scalars(db.select(Adult.id).filter_by(production_id=production_id)))
+    desired = {pair for pair in desired if pair[1] in adult_ids}
+
+    scope = [role.id for role in roles] + ([new_role.id] if new_role_name else [])
+    sync_assignments(CreativeAssignment.__table__, "role_id", "adult_id", scope, desired)
+    analytics.refresh(db.session, production_id)
+
+    page_cache.changed(production_id)
     db.session.commit()
-    return redirect(f"/view/team")
+    page_cache.saved(production_id)
+    documents.saved(production_id, ["team"])
+    return redirect(f"/view/{production_id}/team?draft=1")
 
 
 @edit.get("/<int:production_id>/songs")
@@ -272,61 +372,96 @@ def edit_songs(production_id):
     songs = Song.query.filter_by(production_id=production_id).all()
     roles = Role.query.filter_by(production_id=production_id).all()
 
-    return render_template("edit/songs.jinja", production=production, songs=songs, roles=roles)
+    return render_template("edit/songs.jinja", production=production, songs=songs, roles=roles,
+                           running_order=running_order(production_id))
 
 @edit.post("/<int:production_id>/songs")
 def save_songs(production_id):
-    with db.session.no_autoflush:
-        new_song_title = request.form.get("new_song_title")
-        if new_song_title:
-            raw_act = request.form.get("new_song_act")
-            new_song_act = int(raw_act) if raw_act and raw_act.isdigit() else 10
-            new_song_msg = request.form.get("new_song_intermission_message", "")
-
-            new_song = Song(
-                title=new_song_title,
-                act=new_song_act,
-                intermission_message=new_song_msg,
-                production_id=production_id
-            )
-            db.session.add(new_song)
-            db.session.commit()
-            db.session.flush()
-
-            assigned_roles = request.form.getlist("new_song_roles[]")
-            for r_id in assigned_roles:
-                db.session.add(SongAssignment(song_id=new_song.id, role_id=int(r_id)))
-
-        delete_id = request.form.get("delete_song")
-        if delete_id:
-            SongAssignment.query.filter_by(song_id=int(delete_id)).delete(synchronize_session=False)
-            song_to_delete = Song.query.get(int(delete_id))
-            if song_to_delete:
-                db.session.delete(song_to_delete)
-                db.session.commit()
-                
-        songs = Song.query.filter_by(production_id=production_id).all()
-        for song in songs:
-            title = request.form.get(f"song_title_{song.id}")
-            if title:
-                song.title = title
-
-                raw_act = request.form.get(f"song_act_{song.id}")
-                if raw_act is None or raw_act.strip() == "":
-                    song.act = 20
-                else:
-                    song.act = int(raw_act)
-
-                msg = request.form.get(f"song_msg_{song.id}")
-                song.intermission_message = msg or ""
-
-                selected_roles = request.form.getlist(f"song_roles_{song.id}[]")
-                SongAssignment.query.filter_by(song_id=song.id).delete()
-                for rid in selected_roles:
-                    db.session.add(SongAssignment(song_id=song.id, role_id=int(rid)))
+    desired = set()
+    scope = []
+
+    new_song_title = request.form.get("new_song_title")
+    if new_song_title:
+        raw_act = request.form.get("new_song_act")
+        new_song_act = int(raw_act) if raw_act and raw_act.isdigit() else 10
+        new_song_msg = request.form.get("new_song_intermission_message", "")
+
+        new_song = Song(
+            title=new_song_title,
+            act=new_song_act,
+            intermission_message=new_song_msg,
+            production_id=production_id
+        )
+        db.session.add(new_song)
+        db.session.flush()
+
+        assigned_roles = request.form.getlist("new_song_roles[]")
+        desired.update((new_song.id, int(r_id)) for r_id in assigned_roles)
+        scope.append(new_song.id)
+
+    delete_id = request.form.get("delete_song")
+    if delete_id and Song.query.filter_by(id=int(delete_id), production_id=production_id).delete():
+        scope.append(int(delete_id))
+            
+    songs = Song.query.filter_by(production_id=production_id).all()
+    for song in songs:
+        title = request.form.get(f"song_title_{song.id}")
+        if title:
+            song.title = title
+
+            raw_act = request.form.get(f"song_act_{song.id}")
+            if raw_act is None or raw_act.strip() == "":
+                song.act = 20
+            else:
+                song.act = int(raw_act)
+
+            msg = request.form.get(f"song_msg_{song.id}")
+            song.intermission_message = msg or ""
+
+            selected_roles = request.form.getlist(f"song_roles_{song.id}[]")
+            desired.update((song.id, int(rid)) for rid in selected_roles)
+            scope.append(song.id)
+
+    # Only this production's roles can sing its songs
+    role_ids = set(db.session.scalars(db.select(Role.id).filter_by(production_id=production_id)))
+    desired = {pair for pair in desired if pair[1] in role_ids}
+
+    sync_assignments(SongAssignment.__table__, "song_id", "role_id", scope, desired)
+    analytics.refresh(db.session, production_id)
+
+    page_cache.changed(production_id)
+    db.session.commit()
+    page_cache.saved(production_id)
+    documents.saved(production_id, ["songs"])
+    # The current song may have been renamed, moved or deleted
+    broadcaster.publish(production_id)
+    return redirect(f"/view/{production_id}/songs?draft=1")
+
 
+@edit.post("/<int:production_id>/songs/now")
+def advance_song(production_id):
+    """Stage manager control: move the current song forward, back, or to a given song"""
+    production = Production.query.get_or_404(production_id)
+    order = [song.id for song in running_order(production_id)]
+    action = request.form.get("action")
+    position = order.index(production.current_song_id) if production.current_song_id in order else None
+
+    song_id = request.form.get("song_id")
+    if song_id:
+        if not song_id.isdigit():
+            abort(400)
+        current = int(song_id)
+    elif action == "next":
+        current = order[0 if position is None else min(position + 1, len(order) - 1)] if order else None
+    elif action == "previous":
+        current = order[max(position - 1, 0)] if position is not None else None
+    else:
+        current = None
+
+    production.current_song_id = current if current in order else None
     db.session.commit()
-    return redirect(f"/view/songs")
+    broadcaster.publish(production_id)
+    return redirect(f"/edit/{production_id}/songs")
 
 
 @edit.get("/<int:production_id>/thanks")
@@ -338,5 +473,75 @@ def edit_thanks(production_id):
 def save_thanks(production_id):
     production = Production.query.get(production_id)
     production.thanks = request.form.get("thanks_text", "")
+    page_cache.changed(production_id)
     db.session.commit()
-    return redirect(f"/view/thanks")
\ No newline at end of file
+    page_cache.saved(production_id)
+    documents.saved(production_id, ["production"])
+    return redirect(f"/view/{production_id}/thanks?draft=1")
+
+
+@edit.get("/analytics")
+def analytics_page():
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 1000)
+    return render_template(
+        "edit/analytics.jinja",
+        limit=limit,
+        students=analytics.student_shows(db.session, limit),
+        years=analytics.roles_by_year(db.session),
+        songs=analytics.songs_per_role(db.session),
+    )
+
+
+@edit.get("/api/students")
+def student_search():
+    """Typeahead for the student pickers: ?q=&production_id=&crew=0|1&page=&per_page="""
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", DEFAULT_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    crew = request.args.get("crew")
+    students, total = search_students(
+        request.args.get("q", ""),
+        production_id=request.args.get("production_id", type=int),
+        crew=None if crew is None else crew == "1",
+        page=page,
+        per_page=per_page,
+    )
+    return json_response({
+        "items": [{"id": s.id, "name": s.name, "year": s.year} for s in students],
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+    })
+
+
+# --- Jobs ---
+
+def job_response(job, next_url):
+    """202 with the job's status URL for API clients; the browser form goes to next_url"""
+    if request.accept_mimetypes.best == "application/json":
+        status_url = url_for("edit.job_status", job_id=job.id)
+        return jsonify(job_id=job.id, status_url=status_url), 202, {"Location": status_url}
+    return redirect(next_url)
+
+@edit.get("/jobs/<int:job_id>")
+def job_status(job_id):
+    job = db.session.get(Job, job_id) or abort(404)
+    return jsonify(jobs.status(job))
+
+@edit.post("/students/import")
+def import_students():
+    upload = request.files.get("roster")
+    if not upload or not upload.filename:
+        abort(400)
+    path = upload_dir() / f"roster-{uuid.uuid4().hex}.csv"
+    upload.save(path)
+    return job_response(jobs.submit("import_roster", path=str(path)), "/edit/all")
+
+@edit.post("/<int:production_id>/export")
+def export_static(production_id):
+    Production.query.get_or_404(production_id)
+    return job_response(jobs.submit("export", production_id), "/edit/all")
+
+@edit.post("/<int:production_id>/rebuild")
+def rebuild_cache(production_id):
+    Production.query.get_or_404(production_id)
+    return job_response(jobs.submit("rebuild_cache", production_id), "/edit/all")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+""" Musical API schemas """
+
+from flask_marshmallow import Marshmallow
+
+from App import db
+from App.models import Production, Students, Role, Song
+
+ma = Marshmallow()
+# What Marshmallow.init_app does; these schemas are imported after the app exists
+ma.SQLAlchemySchema.OPTIONS_CLASS.session = db.session
+ma.SQLAlchemyAutoSchema.OPTIONS_CLASS.session = db.session
+
+
+# --- Schemas ---
+
+class ProductionSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Production
+        fields = ("id", "title", "subtitle", "image", "start_date", "end_date", "location", "price", "notes", "thanks")
+
+class StudentSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Students
+        fields = ("id", "name", "year")
+
+class RoleSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Role
+        fields = ("id", "name", "is_group", "students")
+
+    students = ma.Nested(StudentSchema, many=True)
+
+class SongSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Song
+        fields = ("id", "title", "act", "intermission_message", "singers")
+
+    singers = ma.Pluck(RoleSchema, "name", many=True)
+
+class CreativeAssignmentSchema(ma.Schema):
+    role = ma.Function(lambda assignment: assignment.role.name)
+    adult = ma.Function(lambda assignment: assignment.adult.name)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+""" Musical student search """
+
+import re
+from sqlalchemy import column, func, or_, select, text
+
+from App import db
+from App.models import Students, Role, RoleAssignment, CrewAssignment
+
+# External-content FTS5 tables: the text lives in students and role, the
+# triggers keep the indexes in step with every insert, update and delete.
+SEARCH_SCHEMA = {
+    "students_fts": """
+        CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+            name, year, content='students', content_rowid='id',
+            prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+        )""",
+    "role_fts": """
+        CREATE VIRTUAL TABLE IF NOT EXISTS role_fts USING fts5(
+            name, content='role', content_rowid='id',
+            prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+        )""",
+}
+
+SEARCH_TRIGGERS = {
+    "students_fts_insert": """
+        CREATE TRIGGER IF NOT EXISTS students_fts_insert AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts (rowid, name, year) VALUES (new.id, new.name, new.year);
+        END""",
+    "students_fts_delete": """
+        CREATE TRIGGER IF NOT EXISTS students_fts_delete AFTER DELETE ON students BEGIN
+            INSERT INTO students_fts (students_fts, rowid, name, year) VALUES ('delete', old.id, old.name, old.year);
+        END""",
+    "students_fts_update": """
+        CREATE TRIGGER IF NOT EXISTS students_fts_update AFTER UPDATE OF name, year ON students BEGIN
+            INSERT INTO students_fts (students_fts, rowid, name, year) VALUES ('delete', old.id, old.name, old.year);
+            INSERT INTO students_fts (rowid, name, year) VALUES (new.id, new.name, new.year);
+        END""",
+    "role_fts_insert": """
+        CREATE TRIGGER IF NOT EXISTS role_fts_insert AFTER INSERT ON role BEGIN
+            INSERT INTO role_fts (rowid, name) VALUES (new.id, new.name);
+        END""",
+    "role_fts_delete": """
+        CREATE TRIGGER IF NOT EXISTS role_fts_delete AFTER DELETE ON role BEGIN
+            INSERT INTO role_fts (role_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END""",
+    "role_fts_update": """
+        CREATE TRIGGER IF NOT EXISTS role_fts_update AFTER UPDATE OF name ON role BEGIN
+            INSERT INTO role_fts (role_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO role_fts (rowid, name) VALUES (new.id, new.name);
+        END""",
+}
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def create_search_index(connection):
+    """Create the FTS5 tables and triggers, rebuilding an index that was stale"""
+    if connection.dialect.name != "sqlite":
+        return []
+
+    existing = set(connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+    ).scalars())
+    missing = [name for name in [*SEARCH_SCHEMA, *SEARCH_TRIGGERS] if name not in existing]
+    if not missing:
+        return []
+
+    for ddl in [*SEARCH_SCHEMA.values(), *SEARCH_TRIGGERS.values()]:
+        connection.exec_driver_sql(ddl)
+    # Rows written while a table or trigger was missing are not indexed yet
+    for table in SEARCH_SCHEMA:
+        connection.exec_driver_sql(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+    return missing
+
+
+def match_query(q):
+    """Turn typed text into an FTS5 query: every word, as a prefix"""
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def fts_rowids(table, terms):
+    return text(f"SELECT rowid FROM {table} WHERE {table} MATCH :terms").bindparams(terms=terms).columns(column("rowid"))
+
+
+def search_students(q, production_id=None, crew=None, page=1, per_page=DEFAULT_PER_PAGE):
+    """Students whose name or year, or whose role in the production, matches q.
+
+    crew keeps only students on (True) or off (False) the crew of
+    production_id, or of any production when it is None.
+    Returns (students, total) for one page, ordered by name.
+    """
+    query = select(Students)
+    terms = match_query(q or "")
+
+    if terms and db.engine.dialect.name == "sqlite":
+        by_student = fts_rowids("students_fts", terms)
+        by_role = (
+            select(RoleAssignment.student_id)
+            .join(Role, Role.id == RoleAssignment.role_id)
+            .where(Role.id.in_(fts_rowids("role_fts", terms)))
+        )
+        if production_id is not None:
+            by_role = by_role.where(Role.production_id == production_id)
+        query = query.where(or_(Students.id.in_(by_student), Students.id.in_(by_role)))
+    elif terms:
+        pattern = f"%{q.strip()}%"
+        by_role = select(RoleAssignment.student_id).join(Role, Role.id == RoleAssignment.role_id).where(Role.name.ilike(pattern))
+        if production_id is not None:
+            by_role = by_role.where(Role.production_id == production_id)
+        query = query.where(or_(Students.name.ilike(pattern), Students.year.ilike(pattern), Students.id.in_(by_role)))
+
+    if crew is not None:
+        on_crew = select(CrewAssignment.student_id)
+        if production_id is not None:
+            on_crew = on_crew.where(CrewAssignment.production_id == production_id)
+        in_crew = Students.id.in_(on_crew)
+        query = query.where(in_crew if crew else ~in_crew)
+
+    total = db.session.scalar(select(func.count()).select_from(query.subquery()))
+    students = db.session.scalars(
+        query.order_by(Students.name, Students.id).limit(per_page).offset((page - 1) * per_page)
+    ).all()
+    return students, total
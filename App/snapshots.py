@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+""" Musical published snapshots """
+
+import contextlib, os, pathlib, shutil, sqlite3, tempfile, threading
+from collections import OrderedDict
+import sqlalchemy as sa
+from flask import g, has_app_context
+
+from App.database import SNAPSHOT_PRAGMAS, install_sqlite_pragmas
+
+
+def reading_published():
+    """Whether the current request or job reads the published snapshot"""
+    return has_app_context() and g.get("published", False)
+
+@contextlib.contextmanager
+def published(app):
+    """A fresh app context for the current tenant that reads its snapshot"""
+    from App.tenants import current_tenant
+
+    tenant = current_tenant()
+    with app.app_context():
+        g.tenant = tenant
+        g.published = True
+        yield
+
+
+def snapshot_path(engine):
+    """Where a draft SQLite file is published, or None for other databases"""
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return None
+    draft = pathlib.Path(engine.url.database)
+    return draft.with_name(f"{draft.stem}.published{draft.suffix}")
+
+def read_only_uri(path, **params):
+    """A SQLite file: URI for path that opens it read-only"""
+    query = "&".join(f"{key}={value}" for key, value in {"mode": "ro", **params}.items())
+    return f"{pathlib.Path(path).resolve().as_uri()}?{query}"
+
+def identity(path):
+    """Changes whenever a new snapshot is renamed over the old one"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def replace(tmp, path):
+    """Rename tmp over path so readers see the old file or the new one, never a mix"""
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path.parent, os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def schema(connection):
+    """The tables, columns and indexes of a SQLite database"""
+    return set(connection.execute(
+        "SELECT m.type, m.name, p.name FROM sqlite_master m "
+        "LEFT JOIN pragma_table_info(m.name) p ON m.type = 'table' "
+        "WHERE m.type IN ('table', 'index')"
+    ))
+
+
+class Snapshots:
+    """Read-only copies of the draft SQLite databases for the view pages.
+
+    Editors write to the draft; publishing copies it with the SQLite
+    backup API and renames the copy over the snapshot. Requests that read
+    published data open the snapshot with mode=ro&immutable=1: no locks,
+    no WAL, and the whole file memory-mapped. Every worker notices a new
+    snapshot by its inode and reopens it, then rechecks the version of each
+    production it has cached pages for.
+    Postgres and in-memory databases have no snapshot; they read the draft.
+    """
+
+    def __init__(self, max_engines=32):
+        self.enabled = True
+        self.max_engines = max_engines
+        self.pragmas = SNAPSHOT_PRAGMAS
+        # snapshot path -> (identity, engine)
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self._hooks = []
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get("PUBLISH_SNAPSHOTS", self.enabled))
+        self.max_engines = int(app.config.get("SNAPSHOT_POOL_SIZE", app.config.get("TENANT_POOL_SIZE", self.max_engines)))
+        self.pragmas = {**SNAPSHOT_PRAGMAS, **app.config.get("SNAPSHOT_PRAGMAS", {})}
+        app.extensions["snapshots"] = self
+
+    def on_open(self, callback):
+        """Call callback(engine) whenever a snapshot is opened"""
+        self._hooks.append(callback)
+
+    # --- Reading ---
+
+    def engine(self, draft):
+        """Engine on the draft's published snapshot, or None to read the draft"""
+        path = snapshot_path(draft) if self.enabled else None
+        if path is None:
+            return None
+        current = identity(path)
+        if current is None:
+            return None
+
+        with self._lock:
+            cached = self._engines.get(path)
+            if cached is not None and cached[0] == current:
+                self._engines.move_to_end(path)
+                return cached[1]
+
+            engine = sa.create_engine(
+                f"sqlite:///{read_only_uri(path, immutable=1)}&uri=true",
+                connect_args={"check_same_thread": False},
+            )
+            install_sqlite_pragmas(engine, self.pragmas)
+            for hook in self._hooks:
+                hook(engine)
+            self._engines[path] = (current, engine)
+            self._engines.move_to_end(path)
+            evicted = [self._engines.popitem(last=False)[1][1] for _ in range(len(self._engines) - self.max_engines)]
+
+        # New or republished since this worker last looked: the productions it
+        # changed are found by their versions, before a cached page is served
+        from App.cache import page_cache
+        from App.api import documents
+        page_cache.versions.expire()
+        documents.versions.expire()
+        if cached is not None:
+            # Checked-out connections finish reading the old file
+            cached[1].dispose()
+        for old in evicted:
+            old.dispose()
+        return engine
+
+    def publishes(self, draft):
+        """Whether readers see the draft's snapshot rather than the draft itself"""
+        path = snapshot_path(draft) if self.enabled else None
+        return path is not None and path.exists()
+
+    # --- Writing ---
+
+    def publish(self, draft):
+        """Copy the draft to its snapshot in one atomic rename; returns the path"""
+        path = snapshot_path(draft)
+        if path is None or not self.enabled:
+            return None
+
+        fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+        os.close(fd)
+        try:
+            target = sqlite3.connect(tmp)
+            try:
+                with draft.connect() as connection:
+                    # A consistent copy, even while other connections write
+                    connection.connection.driver_connection.backup(target)
+                # An immutable file cannot have a WAL to read
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+            replace(tmp, path)
+        except Exception:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            raise
+        return path
+
+    def migrate(self, draft):
+        """Bring the snapshot's schema up to the draft's without publishing edits"""
+        from App.migrations import upgrade
+
+        path = snapshot_path(draft)
+        if path is None or not self.enabled or not path.exists():
+            return []
+
+        fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+        os.close(fd)
+        try:
+            shutil.copyfile(path, tmp)
+            copy = sa.create_engine(f"sqlite:///{tmp}")
+            try:
+                applied = upgrade(copy)
+            finally:
+                copy.dispose()
+            if applied:
+                replace(tmp, path)
+            else:
+                pathlib.Path(tmp).unlink()
+        except Exception:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            raise
+        return applied
+
+    def refresh(self, draft):
+        """Publish a first snapshot, or migrate one left behind by a schema change"""
+        path = snapshot_path(draft)
+        if path is None or not self.enabled:
+            return
+        if not path.exists():
+            self.publish(draft)
+            return
+
+        with draft.connect() as connection:
+            draft_schema = schema(connection.connection.driver_connection)
+        published_db = sqlite3.connect(read_only_uri(path), uri=True)
+        try:
+            published_schema = schema(published_db)
+        finally:
+            published_db.close()
+        if not draft_schema <= published_schema:
+            self.migrate(draft)
+
+
+snapshots = Snapshots()
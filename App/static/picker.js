@@ -0,0 +1,49 @@
+// Student pickers: the page renders only the current assignments, and
+// typing in the search box adds matching students from /edit/api/students.
+document.querySelectorAll("select[data-search-url]").forEach((select) => {
+    const input = document.createElement("input");
+    input.type = "search";
+    input.className = "form-control form-control-sm mb-1";
+    input.placeholder = "Search students by name, year or role";
+    select.before(input);
+
+    let timer = null;
+    let latest = 0;
+
+    async function search() {
+        const url = new URL(select.dataset.searchUrl, location.origin);
+        url.searchParams.set("q", input.value);
+        const request = ++latest;
+        const response = await fetch(url, { headers: { Accept: "application/json" } });
+        if (!response.ok || request !== latest) {
+            return;
+        }
+        const { items } = await response.json();
+
+        // Keep the selection, replace the previous results
+        for (const option of [...select.options]) {
+            if (!option.selected) {
+                option.remove();
+            }
+        }
+        const present = new Set([...select.options].map((option) => option.value));
+        for (const student of items) {
+            if (!present.has(String(student.id))) {
+                select.add(new Option(student.name, student.id));
+            }
+        }
+    }
+
+    input.addEventListener("input", () => {
+        clearTimeout(timer);
+        timer = setTimeout(search, 200);
+    });
+    input.addEventListener("keydown", (event) => {
+        // Enter searches instead of submitting the editor form
+        if (event.key === "Enter") {
+            event.preventDefault();
+            clearTimeout(timer);
+            search();
+        }
+    });
+});
@@ -0,0 +1,78 @@
+// Musical program service worker
+//
+// Pages post a "precache" message listing the active production's program
+// pages and poster. Later visits are answered from the device cache at once
+// and refreshed in the background (stale-while-revalidate); the server's
+// ETags keep those refreshes to a 304 when nothing changed.
+
+const CACHE = "musical-program-v1";
+
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(keys.filter((key) => key !== CACHE).map((key) => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+function request_for(url) {
+    const sameOrigin = new URL(url, self.location).origin === self.location.origin;
+    return new Request(url, { mode: sameOrigin ? "same-origin" : "no-cors", credentials: "omit" });
+}
+
+self.addEventListener("message", (event) => {
+    if (!event.data || event.data.type !== "precache") {
+        return;
+    }
+    event.waitUntil(
+        caches.open(CACHE).then((cache) =>
+            Promise.all(event.data.urls.map((url) =>
+                cache.match(url).then((hit) => hit || fetch(request_for(url))
+                    .then((response) => cache.put(url, response))
+                    .catch(() => undefined))
+            ))
+        )
+    );
+});
+
+function revalidate(cache, request) {
+    return fetch(request).then((response) => {
+        if (response.ok || response.type === "opaque") {
+            cache.put(request, response.clone());
+        }
+        return response;
+    });
+}
+
+self.addEventListener("fetch", (event) => {
+    const request = event.request;
+    // Live event streams go straight to the network
+    if (request.method !== "GET" || request.headers.get("Accept") === "text/event-stream") {
+        return;
+    }
+
+    const url = new URL(request.url);
+    const programPage = url.origin === self.location.origin && url.pathname.startsWith("/view/");
+    // Draft previews are never kept offline
+    if (programPage && url.searchParams.has("draft")) {
+        return;
+    }
+
+    event.respondWith(
+        caches.open(CACHE).then((cache) =>
+            cache.match(request).then((cached) => {
+                if (!cached && !programPage) {
+                    return fetch(request);
+                }
+                const refreshed = revalidate(cache, request);
+                if (cached) {
+                    event.waitUntil(refreshed.catch(() => undefined));
+                    return cached;
+                }
+                return refreshed;
+            })
+        )
+    );
+});
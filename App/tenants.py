@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+""" Musical tenants """
+
+import pathlib, re, threading
+from collections import OrderedDict
+import click
+import sqlalchemy as sa
+from flask import abort, g, has_app_context, request
+from flask.cli import with_appcontext
+from flask_sqlalchemy import SQLAlchemy
+
+from App.database import engine_options, install_sqlite_pragmas, sqlite_pragmas
+from App.snapshots import reading_published, snapshots
+
+# One DNS label, which is also a safe file name
+TENANT_NAME = re.compile(r"^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$")
+
+
+def current_tenant():
+    """Organization of the current request or job; None is the default database"""
+    return g.get("tenant") if has_app_context() else None
+
+
+class TenantSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy whose default engine is the current organization's database,
+    or its published snapshot when the request reads published pages"""
+
+    @property
+    def engines(self):
+        tenant = current_tenant()
+        engines = super().engines if tenant is None else {None: tenants.engine(tenant)}
+        if reading_published():
+            snapshot = snapshots.engine(engines[None])
+            if snapshot is not None:
+                return {None: snapshot}
+        return engines
+
+
+class TenantEngines:
+    """Bounded LRU pool of per-organization SQLite engines.
+
+    Enabled by TENANT_DOMAIN: a request for <org>.<TENANT_DOMAIN> uses
+    TENANT_DIR/<org>.sqlite3. Organizations are registered with
+    `flask add-tenant <org>`; other subdomains get a 404, unless
+    TENANT_AUTO_CREATE creates their file on first access. A new
+    organization starts empty, with only its tables and settings row.
+    Requests for the bare domain use the default database. At most
+    TENANT_POOL_SIZE engines stay open; the least recently used is disposed.
+    """
+
+    def __init__(self, max_engines=32):
+        self.max_engines = max_engines
+        self.app = None
+        self.domain = None
+        self.directory = None
+        self.auto_create = False
+        self._engines = OrderedDict()
+        self._opening = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._hooks = []
+
+    def init_app(self, app):
+        self.app = app
+        self.domain = (app.config.get("TENANT_DOMAIN") or "").lower() or None
+        self.max_engines = int(app.config.get("TENANT_POOL_SIZE", self.max_engines))
+        self.directory = pathlib.Path(app.config.get("TENANT_DIR") or pathlib.Path(app.instance_path) / "tenants")
+        self.auto_create = app.config.get("TENANT_AUTO_CREATE", self.auto_create)
+        app.extensions["tenants"] = self
+        if self.domain:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            app.before_request(self.select)
+
+    def on_open(self, callback):
+        """Call callback(engine) in the tenant's app context whenever one is opened"""
+        self._hooks.append(callback)
+
+    # --- Routing ---
+
+    def select(self):
+        host = request.host.rsplit(":", 1)[0].lower()
+        if host == self.domain:
+            return
+        if not host.endswith("." + self.domain):
+            abort(404)
+
+        tenant = host[:-len(self.domain) - 1]
+        if not TENANT_NAME.match(tenant):
+            abort(404)
+        if not self.auto_create and not self.path(tenant).exists():
+            abort(404)
+        g.tenant = tenant
+
+    def register(self, tenant, seed=False):
+        """Create an organization's database, with the sample data if seed; returns its path"""
+        if not TENANT_NAME.match(tenant):
+            raise ValueError(f"{tenant!r} is not a valid organization name")
+        path = self.path(tenant)
+        if path.exists():
+            raise ValueError(f"{tenant!r} is already registered")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        engine = self.engine(tenant)
+        if seed:
+            from App.models import seed_db
+            seed_db(self.app, tenant)
+            # Opening published the empty database
+            snapshots.publish(engine)
+        return path
+
+    def path(self, tenant):
+        return self.directory / f"{tenant}.sqlite3"
+
+    # --- Engines ---
+
+    def engine(self, tenant):
+        with self._lock:
+            engine = self._engines.get(tenant)
+            if engine is not None:
+                self._engines.move_to_end(tenant)
+                return engine
+            lock = self._locks.setdefault(tenant, threading.RLock())
+
+        # Only this organization waits while its file is created
+        with lock:
+            with self._lock:
+                engine = self._engines.get(tenant)
+            if engine is None:
+                # Re-entered from _open while the schema is being created
+                engine = self._opening.get(tenant) or self._open(tenant)
+        return engine
+
+    def _open(self, tenant):
+        from App.models import create_db
+        from App.migrations import upgrade
+
+        path = self.path(tenant)
+        uri = f"sqlite:///{path}"
+        engine = sa.create_engine(uri, **engine_options(uri, self.app.config))
+        install_sqlite_pragmas(engine, sqlite_pragmas(self.app.config))
+
+        self._opening[tenant] = engine
+        try:
+            with self.app.app_context():
+                g.tenant = tenant
+                if not path.exists():
+                    create_db(self.app, tenant)
+                upgrade(engine)
+                for hook in self._hooks:
+                    hook(engine)
+        except Exception:
+            engine.dispose()
+            raise
+        finally:
+            self._opening.pop(tenant, None)
+
+        with self._lock:
+            self._engines[tenant] = engine
+            while len(self._engines) > self.max_engines:
+                evicted, old = self._engines.popitem(last=False)
+                self._locks.pop(evicted, None)
+                old.dispose()
+        return engine
+
+    def __len__(self):
+        return len(self._engines)
+
+
+tenants = TenantEngines()
+
+
+@click.command("add-tenant", help="Register an organization, creating its database")
+@click.argument("name")
+@click.option("--seed", is_flag=True, default=False, help="Load the bundled sample roster and production")
+@with_appcontext
+def add_tenant_command(name, seed):
+    try:
+        path = tenants.register(name.lower(), seed=seed)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="NAME")
+    print(f"Created {path}")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+""" Musical template warm-up """
+
+import pathlib, time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+# Compiled ahead of time; the rest compile on first use
+TEMPLATE_PREFIXES = ("view/", "edit/", "base.jinja")
+
+
+# --- Templates ---
+
+def bytecode_cache(app):
+    """Compiled templates on disk, so a new process skips the Jinja compiler"""
+    path = pathlib.Path(app.config.get("JINJA_CACHE_DIR") or pathlib.Path(app.instance_path) / "jinja-cache")
+    path.mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(str(path))
+
+def precompile_templates(app):
+    """Load every view and edit template, writing any missing bytecode; returns the names"""
+    names = app.jinja_env.list_templates(filter_func=lambda name: name.startswith(TEMPLATE_PREFIXES))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+@click.command("precompile", help="Compile the templates into the bytecode cache (build step)")
+@with_appcontext
+def precompile_command():
+    started = time.perf_counter()
+    names = precompile_templates(current_app)
+    print(f"{len(names)} templates compiled in {(time.perf_counter() - started) * 1000:.0f} ms")
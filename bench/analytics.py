@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+""" Musical analytics benchmark """
+
+import pathlib, random, sys, tempfile, time
+from collections import Counter
+from datetime import datetime
+import click
+from faker import Faker
+from sqlalchemy import insert, select
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from App import create_app, db, analytics
+from App.models import Production, Students, Role, RoleAssignment, CrewAssignment, Song, SongAssignment, Participation
+from benchmark import YEARS
+
+
+def generate_seasons(seasons, shows, roster, roles, songs, cast_size, crew, singers, seed=0):
+    """A shared roster cast across many productions, written with bulk inserts"""
+    fake = Faker()
+    Faker.seed(seed)
+    rng = random.Random(seed)
+
+    db.session.execute(insert(Students), [
+        {"name": fake.name()[:50], "sex": rng.choice("MF"), "year": rng.choice(YEARS)} for _ in range(roster)
+    ])
+    student_ids = db.session.scalars(select(Students.id)).all()
+
+    production_ids = []
+    for season in range(seasons):
+        for show in range(shows):
+            production = Production(title=fake.catch_phrase(), start_date=datetime(2016 + season, 3 + show * 3, 1))
+            db.session.add(production)
+            db.session.flush()
+            pid = production.id
+            production_ids.append(pid)
+
+            db.session.execute(insert(Role), [{"name": fake.first_name(), "production_id": pid} for _ in range(roles)])
+            db.session.execute(insert(Song), [{"title": fake.word(), "act": 1, "production_id": pid} for _ in range(songs)])
+            role_ids = db.session.scalars(select(Role.id).filter_by(production_id=pid)).all()
+            song_ids = db.session.scalars(select(Song.id).filter_by(production_id=pid)).all()
+
+            db.session.execute(insert(RoleAssignment), [
+                {"role_id": role_id, "student_id": student_id}
+                for role_id in role_ids for student_id in rng.sample(student_ids, cast_size)
+            ])
+            db.session.execute(insert(CrewAssignment), [
+                {"production_id": pid, "student_id": student_id} for student_id in rng.sample(student_ids, crew)
+            ])
+            db.session.execute(insert(SongAssignment), [
+                {"song_id": song_id, "role_id": role_id}
+                for song_id in song_ids for role_id in rng.sample(role_ids, singers)
+            ])
+    db.session.commit()
+    return production_ids
+
+
+def orm_student_shows():
+    """What answering "shows per student" took before: walk every student's roles"""
+    shows = Counter()
+    for student in Students.query.all():
+        productions = {role.production_id for role in student.roles}
+        if productions:
+            shows[student.id] = len(productions)
+    return shows
+
+
+def timed(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+@click.command(help="Time the analytics reports over many seasons; fail over the budget")
+@click.option("--seasons", default=10, show_default=True)
+@click.option("--shows", default=3, show_default=True, help="Productions per season")
+@click.option("--roster", default=1500, show_default=True, help="Students across all seasons")
+@click.option("--roles", default=60, show_default=True)
+@click.option("--songs", default=30, show_default=True)
+@click.option("--cast-size", default=5, show_default=True)
+@click.option("--crew", default=30, show_default=True)
+@click.option("--singers", default=4, show_default=True)
+@click.option("--budget", default=50.0, show_default=True, help="Milliseconds allowed per report or refresh")
+def main(seasons, shows, roster, roles, songs, cast_size, crew, singers, budget):
+    """Analytics benchmark"""
+    db_file = pathlib.Path(tempfile.mkdtemp()) / "analytics.sqlite3"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_file}"})
+
+    failures = []
+    with app.app_context():
+        production_ids = generate_seasons(seasons, shows, roster, roles, songs, cast_size, crew, singers)
+        started = time.perf_counter()
+        for production_id in production_ids:
+            analytics.refresh(db.session, production_id)
+        db.session.commit()
+        print(f"{len(production_ids)} productions summarized in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        def refresh_one():
+            analytics.refresh(db.session, production_ids[-1])
+            db.session.commit()
+
+        timings = {
+            "refresh one production": timed(refresh_one)[0],
+            "shows per student": timed(lambda: analytics.student_shows(db.session))[0],
+            "roles by class year": timed(lambda: analytics.roles_by_year(db.session))[0],
+            "songs per role": timed(lambda: analytics.songs_per_role(db.session))[0],
+        }
+        walk_ms, walked = timed(orm_student_shows, repeat=1)
+
+        summarized = {row.student_id: row.shows for row in db.session.execute(
+            select(Participation.student_id, db.func.count().label("shows"))
+            .where(Participation.roles > 0)
+            .group_by(Participation.student_id)
+        )}
+        if summarized != dict(walked):
+            failures.append("summaries disagree with the assignments")
+
+    for name, ms in timings.items():
+        print(f"{name:25s}{ms:9.2f} ms")
+        if ms > budget:
+            failures.append(f"{name} over budget")
+    print(f"{'ORM walk (before)':25s}{walk_ms:9.2f} ms")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+""" Musical benchmark """
+
+import json, os, pathlib, random, re, socket, subprocess, sys, tempfile, time, urllib.parse, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import click
+from faker import Faker
+from sqlalchemy import delete, event
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from App import create_app, db, queries
+from App.active import active_production
+from App.snapshots import snapshots
+from App.models import Production, Students, Role, RoleAssignment, CrewAssignment, CreativeRole, Adult, CreativeAssignment, Song, SongAssignment
+
+YEARS = ["First year", "Sophomore", "Junior", "Senior"]
+VIEW_PAGES = ["cast", "team", "songs", "thanks"]
+
+# Instrumentation reports the statement count in Server-Timing
+SQL_COUNT = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+# --- Data ---
+
+def generate(students, roles, songs, cast_size, singers, team, seed=0):
+    """Create one synthetic production at the given scale; returns its id"""
+    fake = Faker()
+    Faker.seed(seed)
+    rng = random.Random(seed)
+
+    start = datetime(2025, 12, 1) + timedelta(days=rng.randrange(60))
+    production = Production(
+        title=fake.catch_phrase(),
+        subtitle=fake.company(),
+        image="",
+        start_date=start,
+        end_date=start + timedelta(days=3),
+        location=fake.address().replace("\n", ", "),
+        price=float(rng.randrange(5, 25)),
+        notes=fake.sentence(),
+        thanks=fake.paragraph(),
+    )
+    db.session.add(production)
+    db.session.flush()
+
+    student_rows = [
+        Students(name=fake.name()[:50], sex=rng.choice("MF"), year=rng.choice(YEARS))
+        for _ in range(students)
+    ]
+    role_rows = [
+        Role(name=fake.first_name(), production_id=production.id, is_group=rng.random() < 0.2)
+        for _ in range(roles)
+    ]
+    song_rows = [
+        Song(title=fake.sentence(nb_words=3).rstrip("."), act=1 + i * 2 // max(songs, 1), production_id=production.id)
+        for i in range(songs)
+    ]
+    creative_rows = [CreativeRole(name=fake.job()[:40], production_id=production.id) for _ in range(team)]
+    adult_rows = [Adult(name=fake.name(), production_id=production.id) for _ in range(team)]
+    db.session.add_all(student_rows + role_rows + song_rows + creative_rows + adult_rows)
+    db.session.flush()
+
+    db.session.add_all(
+        RoleAssignment(role_id=role.id, student_id=student.id)
+        for role in role_rows
+        for student in rng.sample(student_rows, min(cast_size, len(student_rows)))
+    )
+    db.session.add_all(
+        SongAssignment(song_id=song.id, role_id=role.id)
+        for song in song_rows
+        for role in rng.sample(role_rows, min(singers, len(role_rows)))
+    )
+    db.session.add_all(
+        CrewAssignment(production_id=production.id, student_id=student.id)
+        for student in student_rows if rng.random() < 0.1
+    )
+    db.session.add_all(
+        CreativeAssignment(role_id=role.id, adult_id=adult.id)
+        for role, adult in zip(creative_rows, adult_rows)
+    )
+    active_production.set(production.id)
+    db.session.commit()
+    return production.id
+
+
+def edit_forms(production_id):
+    """Form payloads that resubmit each editor's current state"""
+    roles = Role.query.filter_by(production_id=production_id).all()
+    songs = Song.query.filter_by(production_id=production_id).all()
+    creative = CreativeRole.query.filter_by(production_id=production_id).all()
+    production = db.session.get(Production, production_id)
+
+    cast = {}
+    for role in roles:
+        cast[f"role_name_{role.id}"] = role.name
+        cast[f"role_students_{role.id}[]"] = [str(s.id) for s in role.students]
+
+    song_form = {}
+    for song in songs:
+        song_form[f"song_title_{song.id}"] = song.title
+        song_form[f"song_act_{song.id}"] = str(song.act)
+        song_form[f"song_msg_{song.id}"] = song.intermission_message or ""
+        song_form[f"song_roles_{song.id}[]"] = [str(r.id) for r in song.singers]
+
+    team = {"crew_form": "1", "new_crew_students[]": [str(s.id) for s in queries.production_crew(production_id)]}
+    for role in creative:
+        team[f"role_name_{role.id}"] = role.name
+        team[f"role_adults_{role.id}[]"] = [str(a.id) for a in role.adults]
+
+    return {
+        "save_cast": cast,
+        "save_songs": song_form,
+        "save_team": team,
+        "save_thanks": {"thanks_text": production.thanks},
+    }
+
+
+# --- Drivers ---
+
+def summarize(latencies, statements, elapsed):
+    latencies = sorted(latencies)
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "sql_statements": max(statements) if statements else None,
+    }
+
+def run_client(app, requests_per_endpoint, targets):
+    """Drive the Flask test client sequentially"""
+    client = app.test_client()
+    results = {}
+    for endpoint, method, path, form in targets:
+        latencies, statements = [], []
+        started = time.perf_counter()
+        for _ in range(requests_per_endpoint):
+            t = time.perf_counter()
+            response = client.open(path, method=method, data=form)
+            latencies.append(time.perf_counter() - t)
+            match = SQL_COUNT.search(response.headers.get("Server-Timing", ""))
+            if match:
+                statements.append(int(match.group(1)))
+        results[endpoint] = summarize(latencies, statements, time.perf_counter() - started)
+    return results
+
+def run_http(base_url, requests_per_endpoint, concurrency, targets):
+    """Drive a running server over HTTP with a thread pool"""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+    opener = urllib.request.build_opener(NoRedirect)
+
+    def fetch(method, path, form):
+        data = urllib.parse.urlencode(form, doseq=True).encode() if form else None
+        request = urllib.request.Request(base_url + path, data=data, method=method)
+        t = time.perf_counter()
+        try:
+            with opener.open(request) as response:
+                response.read()
+                timing = response.headers.get("Server-Timing", "")
+        except urllib.error.HTTPError as e:
+            timing = e.headers.get("Server-Timing", "")
+        return time.perf_counter() - t, timing
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for endpoint, method, path, form in targets:
+            started = time.perf_counter()
+            outcomes = list(pool.map(lambda _: fetch(method, path, form), range(requests_per_endpoint)))
+            elapsed = time.perf_counter() - started
+            statements = [int(m.group(1)) for _, timing in outcomes if (m := SQL_COUNT.search(timing))]
+            results[endpoint] = summarize([latency for latency, _ in outcomes], statements, elapsed)
+    return results
+
+def run_delete(production_id):
+    """Delete a production with one statement and let the foreign keys cascade"""
+    statements = []
+    def count(*args):
+        statements.append(1)
+
+    rows = sum(
+        db.session.query(model).count()
+        for model in (RoleAssignment, SongAssignment, CreativeAssignment)
+    )
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        db.session.execute(delete(Production).where(Production.id == production_id))
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    return {**summarize([elapsed], [len(statements)], elapsed), "assignments": rows}
+
+def start_gunicorn(db_uri, workers):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    env = {
+        **os.environ,
+        "FLASK_SQLALCHEMY_DATABASE_URI": db_uri,
+        "FLASK_INSTRUMENTATION": "true",
+        "FLASK_SLOW_REQUEST_MS": "1e9",
+        "FLASK_PAGE_CACHE_SIZE": "0",
+    }
+    process = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers), "-b", f"127.0.0.1:{port}", "App:create_app()"],
+        cwd=pathlib.Path(__file__).resolve().parent.parent, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + "/view/").read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise click.ClickException("gunicorn did not start")
+
+
+# --- Baseline ---
+
+def regressions(results, baseline, tolerance=None):
+    """Endpoints running more SQL than the baseline, or slower than it by more than tolerance.
+
+    Statement counts hold on any machine, so they are always checked;
+    latencies only mean something against a baseline from the same machine.
+    """
+    failures = []
+    for endpoint, base in baseline.items():
+        current = results.get(endpoint)
+        if current is None:
+            continue
+        if tolerance is not None and current["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            failures.append(f"{endpoint}: p50 {current['p50_ms']} ms > baseline {base['p50_ms']} ms")
+        if base.get("sql_statements") is not None and (current["sql_statements"] or 0) > base["sql_statements"]:
+            failures.append(f"{endpoint}: {current['sql_statements']} statements > baseline {base['sql_statements']}")
+    return failures
+
+
+@click.command(help="Benchmark the view and edit blueprints on a synthetic production")
+@click.option("--students", default=500, show_default=True)
+@click.option("--roles", default=60, show_default=True)
+@click.option("--songs", default=30, show_default=True)
+@click.option("--cast-size", default=5, show_default=True, help="Students per role")
+@click.option("--singers", default=4, show_default=True, help="Roles per song")
+@click.option("--team", default=10, show_default=True, help="Creative positions")
+@click.option("--requests", "requests_per_endpoint", default=200, show_default=True, help="Requests per endpoint")
+@click.option("--gunicorn", "workers", default=0, help="Also run against gunicorn with this many workers")
+@click.option("--concurrency", default=8, show_default=True, help="Concurrent clients for --gunicorn")
+@click.option("--delete-roles", default=1000, show_default=True, help="Roles in the production timed for deletion (0 to skip)")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Write results as JSON")
+@click.option("--baseline", type=click.Path(dir_okay=False), help="Fail if an endpoint runs more SQL than in this JSON")
+@click.option("--tolerance", type=float, help="Also fail on a p50 slowdown beyond this fraction; only for a baseline from the same machine")
+def main(students, roles, songs, cast_size, singers, team, requests_per_endpoint, workers, concurrency, delete_roles, output, baseline, tolerance):
+    """Benchmark"""
+    db_file = pathlib.Path(tempfile.mkdtemp()) / "bench.sqlite3"
+    db_uri = f"sqlite:///{db_file}"
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": db_uri,
+        "INSTRUMENTATION": True,
+        "SLOW_REQUEST_MS": float("inf"),
+        # Measure rendering, not the page cache
+        "PAGE_CACHE_SIZE": 0,
+    })
+
+    with app.app_context():
+        production_id = generate(students, roles, songs, cast_size, singers, team)
+        forms = edit_forms(production_id)
+        # The view pages read the published snapshot
+        snapshots.publish(db.engine)
+
+    targets = [(f"view.{page}", "GET", f"/view/{production_id}/{page}", None) for page in VIEW_PAGES]
+    targets.append(("view.general", "GET", "/view/", None))
+    targets += [(f"edit.{name}", "POST", f"/edit/{production_id}/{name.split('_')[1]}", form) for name, form in forms.items()]
+
+    report = {
+        "scale": {"students": students, "roles": roles, "songs": songs, "cast_size": cast_size, "singers": singers, "team": team},
+        "results": run_client(app, requests_per_endpoint, targets),
+    }
+    if workers:
+        process, base_url = start_gunicorn(db_uri, workers)
+        try:
+            report["gunicorn"] = {
+                "workers": workers,
+                "concurrency": concurrency,
+                "results": run_http(base_url, requests_per_endpoint, concurrency, targets),
+            }
+        finally:
+            process.terminate()
+            process.wait()
+
+    if delete_roles:
+        # A production of its own, so deleting it leaves the one above intact
+        with app.app_context():
+            doomed = generate(students, delete_roles, delete_roles // 2, cast_size, singers, team, seed=1)
+            report["results"]["edit.delete_production"] = run_delete(doomed)
+
+    print(f"{'endpoint':20s}{'rps':>10s}{'p50 ms':>10s}{'p99 ms':>10s}{'sql':>6s}")
+    for section in [report] + ([report["gunicorn"]] if workers else []):
+        for endpoint, r in section["results"].items():
+            print(f"{endpoint:20s}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{str(r['sql_statements']):>6s}")
+
+    if output:
+        pathlib.Path(output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if baseline:
+        expected = json.loads(pathlib.Path(baseline).read_text())
+        failures = regressions(report["results"], expected.get("results", {}), tolerance)
+        if workers and "gunicorn" in expected:
+            failures += [
+                f"gunicorn {failure}"
+                for failure in regressions(report["gunicorn"]["results"], expected["gunicorn"]["results"], tolerance)
+            ]
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+""" Musical cold start benchmark """
+
+import json, os, pathlib, shutil, socket, statistics, subprocess, sys, tempfile, time, urllib.error, urllib.request
+import click
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# (name, precompiled templates)
+SCENARIOS = (
+    ("cold", False),
+    ("precompiled", True),
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def first_byte(url, started, timeout):
+    """Seconds from started until url answers with its first byte"""
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read(1)
+                return time.perf_counter() - started
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+        except (ConnectionError, urllib.error.URLError):
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(url)
+
+def import_time(env):
+    """Seconds to import the app factory and everything it imports"""
+    code = "import time; t = time.perf_counter(); from App import create_app; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+    return float(result.stdout)
+
+def start_to_first_byte(env, path, timeout):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", "1", "-b", f"127.0.0.1:{port}", "App:create_app()"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        return first_byte(f"http://127.0.0.1:{port}{path}", started, timeout)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+@click.command(help=(
+    "Time from starting gunicorn to the first byte of a page, with and without the template "
+    "bytecode cache. Both scenarios import the whole app; the import time is reported on its own."
+))
+@click.option("--runs", default=5, show_default=True)
+@click.option("--path", default="/view/", show_default=True)
+@click.option("--timeout", default=30.0, show_default=True)
+@click.option("--baseline", type=click.Path(), help="JSON of earlier medians (ms) to compare against")
+@click.option("--tolerance", default=0.25, show_default=True, help="Allowed slowdown against the baseline")
+@click.option("--save", type=click.Path(), help="Write the medians (ms) here")
+def main(runs, path, timeout, baseline, tolerance, save):
+    """Cold start benchmark"""
+    work = pathlib.Path(tempfile.mkdtemp())
+    db_file = work / "cast.sqlite3"
+    shutil.copy(ROOT / "Data" / "cast.sqlite3", db_file)
+    cache_dir = work / "jinja-cache"
+
+    medians = {}
+    for name, precompiled in SCENARIOS:
+        env = {
+            **os.environ,
+            "FLASK_SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_file}",
+            "FLASK_JINJA_CACHE_DIR": str(cache_dir),
+        }
+        times = []
+        for _ in range(runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            if precompiled:
+                subprocess.run([sys.executable, "-m", "flask", "--app", "App", "precompile"],
+                               cwd=ROOT, env=env, check=True, capture_output=True)
+            times.append(start_to_first_byte(env, path, timeout) * 1000)
+        medians[name] = statistics.median(times)
+        print(f"{name:<22} median {medians[name]:7.1f} ms  min {min(times):7.1f} ms")
+
+    times = [import_time(env) * 1000 for _ in range(runs)]
+    medians["imports"] = statistics.median(times)
+    print(f"{'imports':<22} median {medians['imports']:7.1f} ms  min {min(times):7.1f} ms")
+
+    shutil.rmtree(work, ignore_errors=True)
+    if save:
+        pathlib.Path(save).write_text(json.dumps(medians, indent=2) + "\n")
+
+    if baseline:
+        expected = json.loads(pathlib.Path(baseline).read_text())
+        slower = [name for name, ms in medians.items() if name in expected and ms > expected[name] * (1 + tolerance)]
+        for name in slower:
+            print(f"FAIL {name}: {medians[name]:.1f} ms vs baseline {expected[name]:.1f} ms")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+""" Musical live broadcast benchmark """
+
+import pathlib, sys, tempfile, time, tracemalloc
+import click
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from App import create_app, db
+from App.live import broadcaster, running_order
+from App.models import Production
+from benchmark import generate
+
+
+@click.command(help="Hold many idle live subscribers; fail if they exceed the memory budget")
+@click.option("--subscribers", default=5000, show_default=True)
+@click.option("--budget", default=4.0, show_default=True, help="KiB allowed per idle subscriber")
+def main(subscribers, budget):
+    """Live benchmark"""
+    db_file = pathlib.Path(tempfile.mkdtemp()) / "live.sqlite3"
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_file}",
+        "LIVE_MAX_SUBSCRIBERS": subscribers,
+        # Nothing should wake the idle subscribers but the publish below
+        "LIVE_HEARTBEAT": 3600,
+        "LIVE_POLL": 3600,
+    })
+
+    with app.app_context():
+        production_id = generate(students=50, roles=10, songs=20, cast_size=3, singers=2, team=3)
+        broadcaster.channel(production_id)
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        streams = [broadcaster.subscribe(production_id) for _ in range(subscribers)]
+        for stream in streams:
+            next(stream)
+        per_subscriber = sum(
+            stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename")
+        ) / subscribers / 1024
+        tracemalloc.stop()
+
+        over_cap = broadcaster.subscribe(production_id)
+
+        production = db.session.get(Production, production_id)
+        production.current_song_id = running_order(production_id)[0].id
+        db.session.commit()
+        started = time.perf_counter()
+        broadcaster.publish(production_id)
+        messages = {next(stream) for stream in streams}
+        fan_out = time.perf_counter() - started
+
+        for stream in streams:
+            stream.close()
+
+    print(f"{subscribers} idle subscribers: {per_subscriber:.2f} KiB each (budget {budget} KiB)")
+    print(f"publish to all: {fan_out * 1000:.1f} ms, {len(messages)} distinct message(s)")
+    print(f"over the cap: {'refused' if over_cap is None else 'accepted'}; open after close: {broadcaster.subscribers}")
+
+    failures = []
+    if per_subscriber > budget:
+        failures.append("memory per subscriber over budget")
+    if len(messages) != 1:
+        failures.append("subscribers received different messages")
+    if over_cap is not None:
+        failures.append("connection cap not enforced")
+    if broadcaster.subscribers:
+        failures.append("closed subscribers still counted")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
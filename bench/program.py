@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+""" Musical printable program benchmark """
+
+import pathlib, sys, tempfile, time
+import click
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from App import create_app, db
+from App.snapshots import snapshots
+from benchmark import VIEW_PAGES, generate
+
+# selectinload batches 500 parents per statement, so up to 500 roles and songs
+STATEMENTS = 7
+# The production, cast and team sections; the songs' two come after the first byte
+HEADER_STATEMENTS = 5
+
+
+@click.command(help="Time the streamed printable program against the separate pages; fail if it streams late")
+@click.option("--students", default=3000, show_default=True)
+@click.option("--roles", default=400, show_default=True)
+@click.option("--songs", default=120, show_default=True)
+@click.option("--cast-size", default=5, show_default=True)
+@click.option("--singers", default=4, show_default=True)
+@click.option("--team", default=10, show_default=True)
+@click.option("--repeat", default=5, show_default=True)
+def main(students, roles, songs, cast_size, singers, team, repeat):
+    """Printable program benchmark"""
+    db_file = pathlib.Path(tempfile.mkdtemp()) / "program.sqlite3"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_file}", "PAGE_CACHE_SIZE": 0})
+    with app.app_context():
+        production_id = generate(students, roles, songs, cast_size, singers, team)
+        snapshots.publish(db.engine)
+
+    statements = []
+    event.listen(Engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    client = app.test_client()
+    # Opening the snapshot runs statements of its own
+    client.get(f"/view/{production_id}/print").get_data()
+
+    failures = []
+    best = {"first byte": float("inf"), "whole program": float("inf"), "separate pages": float("inf")}
+    for _ in range(repeat):
+        statements.clear()
+        started = time.perf_counter()
+        response = client.get(f"/view/{production_id}/print")
+        chunks = iter(response.response)
+        first = next(chunks)
+        best["first byte"] = min(best["first byte"], time.perf_counter() - started)
+        before_first = len(statements)
+        body = first + b"".join(chunks)
+        best["whole program"] = min(best["whole program"], time.perf_counter() - started)
+        response.close()
+        program = len(statements)
+
+        started = time.perf_counter()
+        for page in VIEW_PAGES:
+            client.get(f"/view/{production_id}/{page}").get_data()
+        client.get("/view/").get_data()
+        best["separate pages"] = min(best["separate pages"], time.perf_counter() - started)
+
+    print(f"{len(body) // 1024} KiB program, {program} statements ({before_first} before the first byte)")
+    for name, seconds in best.items():
+        print(f"{name:16s}{seconds * 1000:9.1f} ms")
+
+    if program != STATEMENTS:
+        failures.append(f"{program} statements, expected {STATEMENTS}")
+    if before_first > HEADER_STATEMENTS:
+        failures.append(f"{before_first} statements before the first byte, expected at most {HEADER_STATEMENTS}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+""" Musical gunicorn settings, read from the working directory """
+
+import os
+
+# The songs page holds a /view/<id>/live stream open for as long as it is
+# shown. A sync worker would spend itself on one stream, so each worker
+# serves requests from a pool of threads instead.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 64))
+
+# Threads kept free of live streams for page and edit requests
+RESERVED_THREADS = 16
+os.environ.setdefault("FLASK_LIVE_MAX_SUBSCRIBERS", str(max(threads - RESERVED_THREADS, 1)))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+""" Musical test fixtures """
+
+import pathlib
+import pytest
+from sqlalchemy import select
+
+from App import create_app, db
+from App.models import create_db, Students, Role, RoleAssignment, CrewAssignment, CreativeRole, Adult, CreativeAssignment, Song, SongAssignment
+from App.api import documents
+from App.cache import page_cache
+from App.snapshots import snapshots
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh copy of the sample database, published"""
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'musical.sqlite3'}",
+        "IMAGE_DIR": str(tmp_path / "images"),
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "EXPORT_DIR": str(tmp_path / "export"),
+        "JINJA_CACHE_DIR": str(tmp_path / "jinja-cache"),
+    })
+    create_db(app, seed=True)
+    with app.app_context():
+        snapshots.publish(db.engine)
+        # The caches outlive the app that filled them
+        page_cache.invalidate()
+        documents.invalidate()
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def grow(app, production_id, n):
+    """Add n roles, songs, crew and creative positions to the production, and publish"""
+    with app.app_context():
+        students = db.session.scalars(select(Students.id).limit(n * 3)).all()
+        roles = [Role(name=f"Role {i}", production_id=production_id) for i in range(n)]
+        songs = [Song(title=f"Song {i}", act=1 + i % 2, production_id=production_id) for i in range(n)]
+        positions = [CreativeRole(name=f"Position {i}", production_id=production_id) for i in range(n)]
+        adults = [Adult(name=f"Adult {i}", production_id=production_id) for i in range(n)]
+        db.session.add_all(roles + songs + positions + adults)
+        db.session.flush()
+        for i, role in enumerate(roles):
+            db.session.add_all(RoleAssignment(role_id=role.id, student_id=s) for s in students[i * 3:i * 3 + 3])
+            db.session.add(SongAssignment(song_id=songs[i].id, role_id=role.id))
+            db.session.add(CreativeAssignment(role_id=positions[i].id, adult_id=adults[i].id))
+        existing = set(db.session.scalars(select(CrewAssignment.student_id).filter_by(production_id=production_id)))
+        db.session.add_all(
+            CrewAssignment(production_id=production_id, student_id=s) for s in students[-n:] if s not in existing
+        )
+        db.session.commit()
+        snapshots.publish(db.engine)
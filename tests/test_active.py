@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+""" Musical active production tests """
+
+import time
+import pytest
+from sqlalchemy import delete
+
+from App import db
+from App.active import active_production
+from App.models import Production
+
+
+def test_a_deleted_active_production_is_noticed(app, monkeypatch):
+    monkeypatch.setattr(active_production, "ttl", 0.05)
+    with app.app_context():
+        assert active_production.get_id() == 1
+
+        # Another worker deletes it; ON DELETE SET NULL clears the id, not the version
+        db.session.execute(delete(Production).filter_by(id=1))
+        db.session.commit()
+        time.sleep(0.1)
+        assert active_production.get_id() is None
+
+@pytest.mark.parametrize("active_id", ["abc", "1.5", "999"])
+def test_save_all_rejects_bad_production_ids(client, active_id):
+    assert client.post("/edit/all", data={"active_production": active_id}).status_code == 400
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Musical JSON API tests """
+
+import time
+from sqlalchemy import update
+
+from App import db
+from App import api
+from App.api import documents
+from App.models import Production
+from App.snapshots import snapshots
+
+
+def test_gzip_and_identity_bodies_have_their_own_etags(client):
+    plain = client.get("/api/productions/1")
+    packed = client.get("/api/productions/1", headers={"Accept-Encoding": "gzip"})
+    assert packed.content_encoding == "gzip"
+    assert plain.headers["ETag"] != packed.headers["ETag"]
+    assert "Accept-Encoding" in packed.headers["Vary"]
+
+    assert client.get("/api/productions/1", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": packed.headers["ETag"],
+    }).status_code == 304
+    # A gzip ETag does not stand for the identity body
+    assert client.get("/api/productions/1", headers={"If-None-Match": packed.headers["ETag"]}).status_code == 200
+
+def test_documents_are_bounded(app, client, monkeypatch):
+    with app.app_context():
+        db.session.add(Production(title="Into the Woods"))
+        db.session.commit()
+        snapshots.publish(db.engine)
+    monkeypatch.setattr(documents, "max_size", 1)
+    assert client.get("/api/productions/1").status_code == 200
+    assert client.get("/api/productions/2").status_code == 200
+    assert len(documents) == 1
+
+def test_a_save_in_another_worker_drops_documents(app, client, monkeypatch):
+    # The API reads the draft, so only the version can tell the documents apart
+    monkeypatch.setattr(snapshots, "enabled", False)
+    monkeypatch.setattr(documents.versions, "ttl", 0.05)
+    client.get("/api/productions/1/production")
+
+    with app.app_context():
+        db.session.get(Production, 1).thanks = "Saved by another worker"
+        db.session.execute(update(Production).filter_by(id=1).values(content_version=Production.content_version + 1))
+        db.session.commit()
+    time.sleep(0.1)
+    assert client.get("/api/productions/1/production").json["thanks"] == "Saved by another worker"
+
+def test_a_section_built_across_a_save_is_not_kept(app, client, monkeypatch):
+    builds = []
+    def build_section(production_id, section):
+        builds.append(section)
+        cached = original(production_id, section)
+        # A save commits while the section is built from the older read
+        documents.invalidate(production_id)
+        return cached
+    original = api.build_section
+    monkeypatch.setattr(api, "build_section", build_section)
+
+    client.get("/api/productions/1/production")
+    client.get("/api/productions/1/production")
+    assert builds == ["production", "production"]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+""" Musical page cache tests """
+
+import time
+from flask import g
+from sqlalchemy import update
+
+from App import db
+from App.cache import cached_page, page_cache
+from App.models import Production
+from App.snapshots import snapshots
+
+
+def add_production(app, title):
+    with app.app_context():
+        db.session.add(Production(title=title))
+        db.session.commit()
+        snapshots.publish(db.engine)
+
+def bump(app, production_id):
+    """What another worker's save leaves in the database"""
+    with app.app_context():
+        db.session.execute(
+            update(Production).filter_by(id=production_id).values(content_version=Production.content_version + 1)
+        )
+        db.session.commit()
+
+def cached(page_cache):
+    return {key[1:] for key in page_cache._pages}
+
+
+def test_a_save_in_another_worker_drops_only_its_production(app, client, monkeypatch):
+    # Pages read the draft, so only the version can tell them apart
+    add_production(app, "Into the Woods")
+    monkeypatch.setattr(snapshots, "enabled", False)
+    monkeypatch.setattr(page_cache.versions, "ttl", 0.05)
+    client.get("/view/1/thanks")
+    client.get("/view/2/thanks")
+    assert len(page_cache) == 2
+
+    bump(app, 1)
+    time.sleep(0.1)
+    client.get("/view/1/cast")
+    client.get("/view/2/cast")
+    assert cached(page_cache) == {(1, "cast"), (2, "thanks"), (2, "cast")}
+
+def test_a_page_invalidated_while_rendering_is_not_kept(app):
+    def render():
+        # A save commits while the page renders
+        page_cache.invalidate(1)
+        return "stale"
+
+    with app.test_request_context():
+        g.published = True
+        cached_page(1, "thanks", render)
+        assert page_cache.get((1, "thanks")) is None
+
+def test_published_pages_change_only_when_their_production_is_published(app, client):
+    add_production(app, "Into the Woods")
+    client.get("/view/1/thanks")
+    client.get("/view/2/thanks")
+
+    client.post("/edit/1/thanks", data={"thanks_text": "Thank you, Decorah"})
+    assert b"Thank you, Decorah" in client.get("/view/1/thanks?draft=1").data
+    # Readers see the published program until the next publish
+    assert b"Thank you, Decorah" not in client.get("/view/1/thanks").data
+    assert len(page_cache) == 2
+
+    client.post("/edit/all", data={"active_production": "1", "publish": "1"})
+    assert b"Thank you, Decorah" in client.get("/view/1/thanks").data
+    assert cached(page_cache) == {(1, "thanks"), (2, "thanks")}
+    kept = page_cache._pages[(None, 2, "thanks")]
+    client.get("/view/2/thanks")
+    assert page_cache._pages[(None, 2, "thanks")] is kept
+
+def test_a_program_invalidated_while_streaming_is_not_kept(client):
+    response = client.get("/view/1/print", buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    # A save commits part way through the program
+    with client.application.test_request_context():
+        page_cache.invalidate(1)
+    b"".join(chunks)
+    response.close()
+    assert len(page_cache) == 0
+
+    client.get("/view/1/print").get_data()
+    assert len(page_cache) == 1
+
+def test_a_save_in_another_worker_drops_the_program(app, client, monkeypatch):
+    monkeypatch.setattr(snapshots, "enabled", False)
+    monkeypatch.setattr(page_cache.versions, "ttl", 0.05)
+    client.get("/view/1/print").get_data()
+    assert len(page_cache) == 1
+
+    bump(app, 1)
+    time.sleep(0.1)
+    client.get("/view/1/thanks")
+    assert [key[-1] for key in page_cache._pages] == ["thanks"]
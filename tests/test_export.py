@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+""" Musical static export tests """
+
+from click.testing import CliRunner
+
+from App import db
+from App.export import export_production, page_path
+from App.models import Production, export
+from App.routes import PAGES
+from App.snapshots import snapshots
+
+
+def test_export_writes_every_page_compressed(app, tmp_path):
+    written = export_production(app, 1, tmp_path)
+
+    for page in PAGES:
+        path = page_path(tmp_path, 1, page)
+        assert path in written
+        assert path.with_name("index.html.gz").exists()
+    assert "The Little Mermaid" in (tmp_path / "view" / "index.html").read_text()
+    assert tmp_path / "view" / "sw.js" in written
+
+def test_export_rewrites_only_changed_pages(app, tmp_path):
+    export_production(app, 1, tmp_path)
+    assert export_production(app, 1, tmp_path) == []
+
+    with app.app_context():
+        db.session.get(Production, 1).thanks = "Thank you, Decorah"
+        db.session.commit()
+        snapshots.publish(db.engine)
+    written = export_production(app, 1, tmp_path)
+    assert page_path(tmp_path, 1, "thanks") in written
+    assert page_path(tmp_path, 1, "cast") not in written
+    assert "Thank you, Decorah" in page_path(tmp_path, 1, "thanks").read_text()
+
+def test_export_command_reports_an_unknown_production(app, tmp_path):
+    with app.app_context():
+        engine = db.engine
+    result = CliRunner().invoke(export, ["999", "-o", str(tmp_path)], obj={"engine": engine})
+    assert result.exit_code == 1
+    assert "no production 999" in result.output
+    assert isinstance(result.exception, SystemExit)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+""" Musical poster image tests """
+
+import pytest
+
+from App import images
+from conftest import FIXTURES
+
+
+def test_ingest_stores_every_width_and_format(app):
+    with app.test_request_context():
+        url = images.ingest((FIXTURES / "poster.png").read_bytes())
+        sources = images.image_sources(url)
+        variants = images.poster_variants(url)
+
+    digest = url.rsplit("/", 1)[-1].split("-")[0]
+    formats = images.available_formats()
+    widths = [320, 640, 960, 1280, 1400]
+    assert url == f"/view/images/{digest}-960.webp"
+    assert sorted(path.name for path in variants) == sorted(f"{digest}-{w}.{fmt}" for w in widths for fmt in formats)
+    assert [source["type"] for source in sources["sources"]] == [f"image/{fmt}" for fmt in images.FORMATS if fmt in formats]
+    for source in sources["sources"]:
+        assert source["srcset"].count("w,") == len(widths) - 1
+    assert len(sources["urls"]) == len(variants)
+
+def test_ingest_reuses_variants_of_the_same_poster(app):
+    data = (FIXTURES / "poster.png").read_bytes()
+    with app.test_request_context():
+        first = images.ingest(data)
+        stored = {path: path.stat().st_mtime_ns for path in images.poster_variants(first)}
+        assert images.ingest(data) == first
+        assert {path: path.stat().st_mtime_ns for path in images.poster_variants(first)} == stored
+
+def test_the_default_is_a_format_that_was_stored(app, monkeypatch):
+    # Pillow built without WebP
+    monkeypatch.setattr(images, "available_formats", lambda: ["avif"])
+    with app.test_request_context():
+        url = images.ingest((FIXTURES / "poster.png").read_bytes())
+        variants = images.poster_variants(url)
+
+    assert url.endswith("-960.avif")
+    assert url.rsplit("/", 1)[-1] in {path.name for path in variants}
+
+def test_image_sources_ignores_remote_posters(app):
+    with app.test_request_context():
+        assert images.image_sources("https://example.com/poster.png") is None
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/poster.png",
+    "http://localhost/poster.png",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.1.2.3/poster.png",
+    "http://[::1]/poster.png",
+    "http://[::ffff:127.0.0.1]/poster.png",
+    "file:///etc/passwd",
+])
+def test_download_refuses_non_public_urls(url):
+    with pytest.raises(ValueError):
+        images.download(url)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Musical background job tests """
+
+import datetime, subprocess, sys, threading, time
+import pytest
+
+from App import db
+from App.jobs import HANDLERS, jobs
+from App.models import Job
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def running_job(owner, heartbeat_at=None):
+    job = Job(kind="test", status="running", owner=owner, heartbeat_at=heartbeat_at)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_recover_only_fails_jobs_whose_worker_is_gone(app):
+    host = jobs.owner().rpartition(":")[0]
+    now = datetime.datetime.now()
+    with app.app_context():
+        jobs._recovered.clear()
+        mine = running_job(jobs.owner())
+        dead = running_job(f"{host}:{dead_pid()}", now)
+        elsewhere = running_job("elsewhere:1", now)
+        stale = running_job("elsewhere:2", now - datetime.timedelta(seconds=jobs.stale_after + 1))
+        unowned = running_job(None)
+        jobs.recover()
+        db.session.expire_all()
+        statuses = {job_id: db.session.get(Job, job_id).status for job_id in (mine, dead, elsewhere, stale, unowned)}
+
+    assert statuses == {mine: "running", dead: "failed", elsewhere: "running", stale: "failed", unowned: "failed"}
+
+def test_progress_reaches_the_job_row(app, monkeypatch):
+    monkeypatch.setattr(jobs, "heartbeat", 0.05)
+    release = threading.Event()
+    def wait(job, report):
+        report(3, 10)
+        release.wait(5)
+        return "done"
+    monkeypatch.setitem(HANDLERS, "test-wait", wait)
+
+    with app.app_context():
+        job_id = jobs.submit("test-wait").id
+        try:
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                db.session.expire_all()
+                job = db.session.get(Job, job_id)
+                if job.progress == 3:
+                    break
+                time.sleep(0.05)
+            assert (job.status, job.progress, job.total, job.owner) == ("running", 3, 10, jobs.owner())
+        finally:
+            release.set()
+        jobs.shutdown()
+        db.session.expire_all()
+        assert db.session.get(Job, job_id).status == "done"
+
+def test_a_new_app_shuts_down_the_old_pool(app):
+    old = jobs._executor
+    # What every create_app() does
+    jobs.init_app(app)
+    assert jobs._executor is not old
+    with pytest.raises(RuntimeError):
+        old.submit(print)
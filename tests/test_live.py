@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Musical live broadcast tests """
+
+import json, threading, tracemalloc
+import pytest
+from sqlalchemy import update
+
+from App import db
+from App.export import export_production, page_path
+from App.live import HEARTBEAT, broadcaster, running_order
+from App.models import Production
+
+SUBSCRIBERS = 5000
+# KiB allowed per idle subscriber
+BUDGET = 4.0
+
+
+def song_event(message):
+    return json.loads(message.decode().split("data: ", 1)[1])
+
+
+@pytest.fixture
+def live(app, monkeypatch):
+    monkeypatch.setattr(broadcaster, "max_subscribers", SUBSCRIBERS)
+    monkeypatch.setattr(broadcaster, "heartbeat", 3600)
+    monkeypatch.setattr(broadcaster, "poll", 3600)
+    with app.app_context():
+        yield 1
+
+
+def test_idle_subscribers_are_cheap_and_share_one_message(live):
+    broadcaster.channel(live)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    streams = [broadcaster.subscribe(live) for _ in range(SUBSCRIBERS)]
+    for stream in streams:
+        next(stream)
+    per_subscriber = sum(
+        stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename")
+    ) / SUBSCRIBERS / 1024
+    tracemalloc.stop()
+    assert per_subscriber < BUDGET
+
+    assert broadcaster.subscribe(live) is None
+
+    song = running_order(live)[0]
+    db.session.execute(update(Production).filter_by(id=live).values(current_song_id=song.id))
+    db.session.commit()
+    broadcaster.publish(live)
+    messages = {next(stream) for stream in streams}
+    assert len(messages) == 1
+    assert song_event(messages.pop())["song_id"] == song.id
+
+    for stream in streams:
+        stream.close()
+    assert broadcaster.subscribers == 0
+
+def test_idle_subscribers_only_wake_for_the_heartbeat(live, monkeypatch):
+    monkeypatch.setattr(broadcaster, "heartbeat", 0.2)
+    stream = broadcaster.subscribe(live)
+    next(stream)
+    got = []
+    thread = threading.Thread(target=lambda: got.append(next(stream)))
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+    thread.join(1)
+    assert got == [HEARTBEAT]
+    stream.close()
+
+def test_songs_advanced_by_another_worker_arrive(live, monkeypatch):
+    monkeypatch.setattr(broadcaster, "poll", 0.05)
+    stream = broadcaster.subscribe(live)
+    next(stream)
+
+    # Committed without publishing, as another worker would
+    song = running_order(live)[0]
+    db.session.execute(update(Production).filter_by(id=live).values(current_song_id=song.id))
+    db.session.commit()
+    assert song_event(next(stream))["song_id"] == song.id
+    stream.close()
+
+@pytest.mark.parametrize("song_id", ["abc", "-1", "1.5"])
+def test_advance_song_rejects_bad_song_ids(client, song_id):
+    assert client.post("/edit/1/songs/now", data={"song_id": song_id}).status_code == 400
+
+def test_advance_song_moves_to_the_next_song(client):
+    assert client.post("/edit/1/songs/now", data={"action": "next"}).status_code == 302
+
+def test_only_served_songs_pages_open_the_live_stream(app, client, tmp_path):
+    assert b"EventSource" in client.get("/view/1/songs").data
+    export_production(app, 1, tmp_path / "site")
+    assert "EventSource" not in page_path(tmp_path / "site", 1, "songs").read_text()
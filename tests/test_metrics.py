@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+""" Musical request instrumentation tests """
+
+import json, logging
+import pytest
+from sqlalchemy import text
+
+from App import create_app, db
+from App.api import documents
+from App.cache import page_cache
+from App.metrics import instrumentation
+from App.models import create_db
+from App.snapshots import snapshots
+from test_queries import STATEMENTS
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An instrumented app, with a view that fails part way through its queries"""
+    app = create_app({
+        "TESTING": True,
+        "INSTRUMENTATION": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'musical.sqlite3'}",
+        "IMAGE_DIR": str(tmp_path / "images"),
+        "JINJA_CACHE_DIR": str(tmp_path / "jinja-cache"),
+    })
+
+    @app.route("/broken")
+    def broken():
+        db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT missing FROM nowhere"))
+
+    create_db(app, seed=True)
+    with app.app_context():
+        snapshots.publish(db.engine)
+        page_cache.invalidate()
+        documents.invalidate()
+    yield app
+    instrumentation.enabled = False
+
+def logged(caplog):
+    """The JSON lines logged for each request"""
+    return [json.loads(record.getMessage()) for record in caplog.records if record.getMessage().startswith("{")]
+
+
+def test_streamed_response_is_recorded_after_its_body(app, caplog):
+    caplog.set_level(logging.INFO, logger=app.logger.name)
+    client = app.test_client()
+    # Opening the snapshot is not part of any page
+    client.get("/view/")
+    caplog.clear()
+
+    response = client.get("/view/1/print")
+    assert response.is_streamed
+    body = response.get_data(as_text=True)
+    response.close()
+
+    assert "</html>" in body
+    assert "Server-Timing" not in response.headers
+    [line] = logged(caplog)
+    assert line["endpoint"] == "view.print_program"
+    assert line["sql_count"] == STATEMENTS["/view/{id}/print"]
+    assert line["template_ms"] > 0
+
+def test_failed_request_leaves_no_timings_behind(app, caplog):
+    caplog.set_level(logging.INFO, logger=app.logger.name)
+    client = app.test_client()
+    # Opening the snapshot is not part of any page
+    client.get("/view/")
+    caplog.clear()
+
+    with pytest.raises(Exception, match="no such table"):
+        client.get("/broken")
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert not connection.info.get("metrics_start")
+
+    client.get("/view/1/thanks")
+    [line] = logged(caplog)
+    assert line["endpoint"] == "view.thanks"
+    assert line["sql_count"] == STATEMENTS["/view/{id}/thanks"]
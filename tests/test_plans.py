@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+""" Musical query plan tests """
+
+from sqlalchemy import event, select
+
+from App import db
+from App.models import Production
+from App.routes import PAGES
+from conftest import grow
+
+
+def full_scans(app, production_id):
+    """EXPLAIN QUERY PLAN every statement the view pages run.
+
+    Returns (page, statement, plan detail) for each full table scan, so a
+    missing index shows up before it shows up in production.
+    """
+    statements = []
+    page = None
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((page, statement, parameters))
+
+    with app.test_request_context():
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            for page, render in PAGES.items():
+                render(production_id)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+        scans = []
+        with db.engine.connect() as connection:
+            for page, statement, parameters in statements:
+                plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+                for row in plan:
+                    detail = row[-1]
+                    if detail.startswith("SCAN") and "USING" not in detail:
+                        scans.append((page, statement, detail))
+    return scans
+
+
+def test_view_pages_use_indexes(app):
+    with app.app_context():
+        production_id = db.session.scalar(select(Production.id))
+    grow(app, production_id, 20)
+
+    scans = full_scans(app, production_id)
+    assert scans == [], "\n".join(f"{page}: {detail} in {' '.join(statement.split())}" for page, statement, detail in scans)
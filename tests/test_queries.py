@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+""" Musical view page query tests """
+
+import contextlib, re
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+
+from App import db
+from App.active import active_production
+from App.cache import page_cache
+from App.models import Production
+from conftest import grow
+
+# Statements per page, whatever the size of the production
+STATEMENTS = {
+    "/view/": 2,
+    "/view/{id}/cast": 3,
+    "/view/{id}/team": 3,
+    "/view/{id}/songs": 3,
+    "/view/{id}/thanks": 1,
+    "/view/{id}/print": 7,
+}
+# The printable program's production, cast and team sections
+HEADER_STATEMENTS = 5
+SONGS_QUERY = re.compile(r"\bFROM song\b")
+
+
+@contextlib.contextmanager
+def counting():
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+def statements_per_page(client, production_id):
+    counts = {}
+    for path in STATEMENTS:
+        url = path.format(id=production_id)
+        with counting() as statements:
+            response = client.get(url)
+            response.get_data()
+        assert response.status_code == 200, url
+        counts[path] = len(statements)
+    return counts
+
+
+@pytest.fixture
+def production_id(app, client, monkeypatch):
+    # Every request renders and looks up the active production
+    monkeypatch.setattr(page_cache, "max_size", 0)
+    monkeypatch.setattr(active_production, "ttl", 0)
+    with app.app_context():
+        production_id = db.session.scalar(select(Production.id))
+    # Opening the snapshot is not part of any page
+    client.get("/view/")
+    return production_id
+
+def test_view_pages_run_a_fixed_number_of_statements(app, client, production_id):
+    assert statements_per_page(client, production_id) == STATEMENTS
+
+    grow(app, production_id, 20)
+    client.get("/view/")
+    assert statements_per_page(client, production_id) == STATEMENTS
+
+def test_the_program_streams_before_the_songs_are_queried(app, client, production_id):
+    # Enough cast to fill the first chunk
+    grow(app, production_id, 60)
+    client.get("/view/")
+    with counting() as statements:
+        response = client.get(f"/view/{production_id}/print", buffered=False)
+        chunks = iter(response.response)
+        assert next(chunks)
+        before_first = list(statements)
+        b"".join(chunks)
+        response.close()
+
+    assert len(before_first) <= HEADER_STATEMENTS
+    assert not any(SONGS_QUERY.search(statement) for statement in before_first)
+    assert any(SONGS_QUERY.search(statement) for statement in statements)
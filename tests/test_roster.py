@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+""" Musical roster import tests """
+
+from App import db
+from App.roster import import_roster
+
+
+def write_roster(path, rows):
+    path.write_text("name,sex,year\n" + "".join(f"{name},{sex},{year}\n" for name, sex, year in rows), encoding="utf8")
+    return path
+
+def test_unchanged_rows_are_not_counted_as_updated(app, tmp_path):
+    roster = write_roster(tmp_path / "roster.csv", [
+        ("Michael Rogers", "F", "Junior"),
+        ("Daniel Simmons", "F", "Junior"),
+        ("Avery Lindqvist", "F", "First year"),
+    ])
+    done = []
+    with app.app_context(), db.engine.begin() as connection:
+        result = import_roster(connection, roster, progress=done.append)
+    # Michael Rogers is already F; Daniel Simmons was M
+    assert (result.inserted, result.updated, result.rejected) == (1, 1, [])
+    assert done == [3]
+
+    with app.app_context(), db.engine.begin() as connection:
+        result = import_roster(connection, roster)
+    assert (result.inserted, result.updated) == (0, 0)
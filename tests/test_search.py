@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Musical student search tests """
+
+from sqlalchemy import delete, update
+
+from App import db
+from App.models import Students
+from App.search import search_students
+
+
+def names(app, q, **filters):
+    with app.app_context():
+        students, total = search_students(q, **filters)
+        assert total == len(students)
+        return [s.name for s in students]
+
+
+def test_search_endpoint_matches_name_prefixes(client):
+    response = client.get("/edit/api/students?q=mich rog")
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json["items"]] == ["Michael Rogers"]
+    assert response.json["total"] == 1
+
+def test_search_finds_students_by_their_role(app):
+    # The sample production casts student 1 as Ariel
+    with app.app_context():
+        cast = db.session.get(Students, 1).name
+    assert names(app, "ari", production_id=1) == [cast]
+
+def test_triggers_keep_the_index_in_step(app):
+    with app.app_context():
+        db.session.add(Students(name="Zephyrine Quill", year="Senior"))
+        db.session.commit()
+    assert names(app, "zephy") == ["Zephyrine Quill"]
+
+    with app.app_context():
+        db.session.execute(update(Students).filter_by(name="Zephyrine Quill").values(name="Odalys Quill"))
+        db.session.commit()
+    assert names(app, "zephy") == []
+    assert names(app, "odaly") == ["Odalys Quill"]
+
+    with app.app_context():
+        db.session.execute(delete(Students).filter_by(name="Odalys Quill"))
+        db.session.commit()
+    assert names(app, "odaly") == []
+
+def test_other_databases_fall_back_to_ilike(app, monkeypatch):
+    with app.app_context():
+        # What the query builder sees on Postgres
+        monkeypatch.setattr(db.engine.dialect, "name", "postgresql")
+        students, total = search_students("ICHAEL ROG")
+    assert [s.name for s in students] == ["Michael Rogers"]
+    assert total == 1
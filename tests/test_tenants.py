@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+""" Musical tenant routing tests """
+
+import pytest
+
+from App.tenants import tenants
+
+
+@pytest.fixture
+def domain(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "domain", "musical.test")
+    monkeypatch.setattr(tenants, "directory", tmp_path / "tenants")
+    tenants.directory.mkdir()
+    app.before_request_funcs.setdefault(None, []).insert(0, tenants.select)
+    yield "musical.test"
+    # The pool outlives the app
+    while tenants._engines:
+        tenants._engines.popitem()[1].dispose()
+
+def test_unknown_organizations_are_not_created(client, domain):
+    assert client.get("/view/", base_url=f"http://nobody.{domain}").status_code == 404
+    assert not tenants.path("nobody").exists()
+
+def test_registered_organizations_get_their_own_database(app, client, domain):
+    result = app.test_cli_runner().invoke(args=["add-tenant", "Decorah"])
+    assert result.exit_code == 0, result.output
+    assert tenants.path("decorah").exists()
+    # Nothing of the default database's roster or productions
+    assert client.get("/view/", base_url=f"http://decorah.{domain}").status_code == 404
+    assert client.get("/edit/api/students", base_url=f"http://decorah.{domain}").json["total"] == 0
+
+    result = app.test_cli_runner().invoke(args=["add-tenant", "decorah"])
+    assert result.exit_code != 0
+    assert "already registered" in result.output
+
+def test_organizations_are_seeded_on_request(app, client, domain):
+    result = app.test_cli_runner().invoke(args=["add-tenant", "luther", "--seed"])
+    assert result.exit_code == 0, result.output
+    assert client.get("/view/", base_url=f"http://luther.{domain}").status_code == 200
+
+def test_auto_create_is_opt_in(client, domain, monkeypatch):
+    monkeypatch.setattr(tenants, "auto_create", True)
+    assert client.get("/edit/all", base_url=f"http://newschool.{domain}").status_code == 200
+    assert tenants.path("newschool").exists()